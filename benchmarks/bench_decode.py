@@ -0,0 +1,266 @@
+"""Stage-level decoding benchmark
+
+Decode a max-capacity symbol of every version, EC level and mode (numeric,
+alphanumeric, 8-bit byte), timing each stage of the decoding. The symbols
+are generated with the reference lib and cached to disk: the 8-bit ones are
+the same as the ones of tests/test_qr.py::TestDecode (and share its cache),
+the others are cached in benchmarks/qr_cache.
+
+Results can be saved as JSON (--output) and compared against a saved
+baseline (--baseline): the exit status is 1 if a timing regressed by more
+than --threshold.
+
+    PYTHONPATH=src python benchmarks/bench_decode.py --output baseline.json
+    PYTHONPATH=src python benchmarks/bench_decode.py --baseline baseline.json
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+from os import makedirs
+from os.path import dirname, exists, join
+from time import perf_counter_ns
+
+from qrcode import QRCode
+from qrcode.util import QRData, MODE_NUMBER, MODE_ALPHA_NUM
+
+from qr import consts
+from qr.decoder import QrCodeDecoder, warm_up
+from qr.profiling import StageProfiler
+
+BENCHMARKS_DIR = dirname(__file__)
+TESTS_DIR = join(dirname(BENCHMARKS_DIR), 'tests')
+TESTS_CACHE_DIR = join(TESTS_DIR, 'qr_cache')
+CACHE_DIR = join(BENCHMARKS_DIR, 'qr_cache')
+
+EC_STR = ['L', 'M', 'Q', 'H']
+MODES = {
+    'numeric': consts.DataModeIndicator.NUMERIC,
+    'alphanumeric': consts.DataModeIndicator.ALPHANUMERIC,
+    'eightbitbyte': consts.DataModeIndicator.EIGHTBITBYTE,
+}
+STAGES = ['load', 'format', 'unfold', 'unmask', 'deinterlace', 'correct', 'parse']
+
+def capacity(version, ec_level, mode):
+    """Maximum number of characters of a single segment symbol"""
+
+    data_bit_len = 8 * sum(nb_blocks * nb_data_words \
+            for nb_blocks, (_, nb_data_words, _) in consts.EC_BLOCKS[version][ec_level])
+    data_bit_len -= consts.DATA_MODE_INDICATOR_BIT_LEN + consts.char_count_bit_len(version, mode)
+
+    if mode == consts.DataModeIndicator.NUMERIC:
+        count = 3 * (data_bit_len // consts.NUM_TRIPLE_BIT_LEN)
+        rest = data_bit_len % consts.NUM_TRIPLE_BIT_LEN
+        return count + (2 if rest >= consts.NUM_DOUBLE_BIT_LEN else \
+                1 if rest >= consts.NUM_SINGLE_BIT_LEN else 0)
+
+    if mode == consts.DataModeIndicator.ALPHANUMERIC:
+        count = 2 * (data_bit_len // consts.ALPHANUM_DOUBLE_BIT_LEN)
+        return count + (data_bit_len % consts.ALPHANUM_DOUBLE_BIT_LEN \
+                >= consts.ALPHANUM_SINGLE_BIT_LEN)
+
+    return data_bit_len // consts.EIGHTBIT_BIT_LEN
+
+def symbol_data(mode_name, length, lorem):
+    if mode_name == 'numeric':
+        return ''.join(str(7 * i % 10) for i in range(length))
+    if mode_name == 'alphanumeric':
+        return ''.join(consts.ALPHANUM_CHARSET[7 * i % consts.ALPHANUM_CHARSET_LEN] \
+                for i in range(length))
+    return lorem[:length]
+
+def load_symbol(version, ec_str, mode_name, lorem):
+    """Get the rows of a max-capacity symbol (generated and cached to disk if needed)"""
+
+    ec_level = consts.EC_LEVEL.index(ec_str)
+    mode = MODES[mode_name]
+    data = symbol_data(mode_name, capacity(version, ec_level, mode), lorem)
+
+    if mode_name == 'eightbitbyte':
+        cache_dir = TESTS_CACHE_DIR
+        filename = join(cache_dir, f"{version}{ec_str}.qr")
+    else:
+        cache_dir = CACHE_DIR
+        filename = join(cache_dir, f"{version}{ec_str}-{mode_name}.qr")
+
+    if not exists(filename):
+        # Same symbols as tests/test_qr.py::TestDecode for 8-bit byte mode
+        qr_code = QRCode(version=version, error_correction=ec_level,
+                mask_pattern=(EC_STR.index(ec_str) + version) % 8)
+        if mode_name == 'numeric':
+            qr_code.add_data(QRData(data.encode('ascii'), mode=MODE_NUMBER))
+        elif mode_name == 'alphanumeric':
+            qr_code.add_data(QRData(data.encode('ascii'), mode=MODE_ALPHA_NUM))
+        else:
+            qr_code.add_data(data)
+        qr_code.make(fit=False)
+
+        makedirs(cache_dir, exist_ok=True)
+        with open(filename, "w", encoding="ascii") as file:
+            for row in qr_code.modules:
+                file.write(''.join(str(int(module)) for module in row))
+                file.write('\n')
+
+    with open(filename, 'r', encoding="ascii") as file:
+        return [row.strip() for row in file], data
+
+def time_stages(rows, engine):
+    """Decode a symbol, return the duration (ns) of each stage (see qr.profiling)"""
+
+    profiler = StageProfiler()
+    text = QrCodeDecoder(rows, engine, observer=profiler).decode().text
+    return [profiler.durations_ns[stage] for stage in STAGES], text
+
+def time_decode(rows, engine):
+    start = perf_counter_ns()
+    text = QrCodeDecoder(rows, engine).decode().text
+    return perf_counter_ns() - start, text
+
+def run(versions, ec_strs, mode_names, engine, repeat):
+    with open(join(TESTS_DIR, 'lorem.txt'), 'r', encoding='utf-8') as file:
+        lorem = file.read()
+
+    # Per-version tables are built once per process: leave them out of the timings
+    warm_up(versions, engine)
+
+    results = []
+    for mode_name in mode_names:
+        for version in versions:
+            for ec_str in ec_strs:
+                rows, data = load_symbol(version, ec_str, mode_name, lorem)
+
+                stage_samples = []
+                total_samples = []
+                for _ in range(repeat):
+                    durations, text = time_stages(rows, engine)
+                    assert text == data, f"Wrong decoding of {version}{ec_str} ({mode_name})"
+                    stage_samples.append(durations)
+                    total_samples.append(time_decode(rows, engine)[0])
+
+                stages = {stage: int(statistics.median(samples)) \
+                        for stage, samples in zip(STAGES, zip(*stage_samples))}
+                total = int(statistics.median(total_samples))
+                results.append({
+                    'version': version,
+                    'ec_level': ec_str,
+                    'mode': mode_name,
+                    'chars': len(data),
+                    'stages_ns': stages,
+                    'total_ns': total,
+                    'symbols_per_s': 1e9 / total,
+                    'chars_per_s': 1e9 * len(data) / total,
+                })
+
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'engine': engine,
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+def print_report(report):
+    print(f"{'mode':<13}{'version':>8}" + ''.join(f"{stage:>12}" for stage in STAGES) \
+            + f"{'total':>12}{'symbols/s':>12}{'chars/s':>12}")
+
+    # Break the results down by mode and version (averaging over the EC levels)
+    groups = {}
+    for result in report['results']:
+        groups.setdefault((result['mode'], result['version']), []).append(result)
+
+    for (mode_name, version), results in groups.items():
+        stages = [statistics.mean(result['stages_ns'][stage] for result in results) \
+                for stage in STAGES]
+        total = statistics.mean(result['total_ns'] for result in results)
+        chars = statistics.mean(result['chars'] for result in results)
+        print(f"{mode_name:<13}{version:>8}" + ''.join(f"{stage / 1000:>10.1f}us" \
+                for stage in stages) + f"{total / 1000:>10.1f}us{1e9 / total:>12.0f}" \
+                f"{1e9 * chars / total:>12.0f}")
+
+    for mode_name in MODES:
+        totals = [result['total_ns'] for result in report['results'] \
+                if result['mode'] == mode_name]
+        if totals:
+            print(f"{mode_name}: {len(totals) * 1e9 / sum(totals):.0f} symbols/s overall")
+
+def compare(report, baseline, threshold, min_delta_ns=0):
+    """Return the timings of report that regressed by more than threshold
+
+    Slowdowns of less than min_delta_ns are regarded as noise.
+    """
+
+    def key(result):
+        return result['version'], result['ec_level'], result['mode']
+
+    baseline_results = {key(result): result for result in baseline['results']}
+
+    regressions = []
+    for result in report['results']:
+        base = baseline_results.get(key(result))
+        if base is None:
+            continue
+
+        timings = [('total', result['total_ns'], base['total_ns'])]
+        timings += [(stage, result['stages_ns'][stage], base['stages_ns'].get(stage)) \
+                for stage in STAGES]
+        for name, current, previous in timings:
+            if previous and current > previous * (1 + threshold) \
+                    and current - previous >= min_delta_ns:
+                regressions.append((key(result), name, previous, current))
+
+    return regressions
+
+def parse_versions(spec):
+    versions = []
+    for part in spec.split(','):
+        first, _, last = part.partition('-')
+        versions.extend(range(int(first), int(last or first) + 1))
+    return versions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--versions', type=parse_versions, default=list(range(1, 41)),
+            help="versions to benchmark, e.g. 1-10,20,40 (default: all)")
+    parser.add_argument('--ec-levels', default=''.join(EC_STR),
+            help="EC levels to benchmark (default: LMQH)")
+    parser.add_argument('--modes', default=','.join(MODES),
+            help="comma separated modes to benchmark (default: all)")
+    parser.add_argument('--engine', default=None, help="decoding engine (default: python)")
+    parser.add_argument('--repeat', type=int, default=5,
+            help="number of runs of each symbol, the median is kept (default: 5)")
+    parser.add_argument('--output', help="save the results to this JSON file")
+    parser.add_argument('--baseline', help="compare the results to this JSON file")
+    parser.add_argument('--threshold', type=float, default=0.1,
+            help="relative slowdown regarded as a regression (default: 0.1)")
+    parser.add_argument('--min-delta', type=float, default=5,
+            help="slowdown (in us) below which timings are not compared (default: 5)")
+    args = parser.parse_args(argv)
+
+    report = run(args.versions, list(args.ec_levels), args.modes.split(','), args.engine,
+            args.repeat)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=1)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+
+        regressions = compare(report, baseline, args.threshold, 1000 * args.min_delta)
+        for (version, ec_str, mode_name), name, previous, current in regressions:
+            print(f"Regression: {version}{ec_str} {mode_name} {name}: " \
+                    f"{previous / 1000:.1f}us -> {current / 1000:.1f}us")
+        if regressions:
+            return 1
+        print("No regression")
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""Galois field and BCH / Reed-Solomon decoding micro-benchmarks
+
+The workloads are the ones of tests/test_galois.py and tests/test_bch.py
+(scaled up), plus the Reed-Solomon decoding of QR Code blocks.
+
+    PYTHONPATH=src python benchmarks/bench_galois.py
+"""
+
+import argparse
+import random
+import sys
+from time import perf_counter_ns
+
+from ec.bch import BCH, BchDecodingFailure
+from ec.galois import BinaryGaloisField
+from ec.galois_array import BinaryGaloisFieldArray
+from ec.rs import ReedSolomon
+
+def gf_ops(m):
+    gf = BinaryGaloisField(m)
+    values = list(range(1, 2**m))
+    others = values[::max(1, len(values) // 64)]
+
+    def run():
+        for x in values:
+            for y in others:
+                gf.gf_mul(x, y)
+                gf.gf_div(x, y)
+            gf.gf_inv(x)
+            gf.gf_pow(x, 25)
+    return run
+
+def gf_poly(m):
+    gf = BinaryGaloisField(m)
+    rng = random.Random(m)
+    polys = [[rng.randrange(2**m) for _ in range(30)] for _ in range(20)]
+
+    def run():
+        for poly1, poly2 in zip(polys, polys[1:]):
+            gf.gf_poly_mul(poly1, poly2)
+            gf.gf_poly_scale(poly1, poly2[0])
+            for x in poly2:
+                gf.gf_poly_eval(poly1, x)
+    return run
+
+def bch_format_decode():
+    bch = BCH(4, 5, 3, 0)
+    formats = []
+    for data in range(32):
+        remainder = data << 10
+        for i in range(14, 9, -1):
+            if remainder >> i & 1:
+                remainder ^= 0x537 << (i - 10)
+        formats.append((data << 10) | remainder)
+    errors = [0, 1, 1 << 14, 0b101, 0b111, 0b100101000000, 0b11110000000]
+
+    def run():
+        for format_ in formats:
+            for error in errors:
+                try:
+                    bch.decode(format_ ^ error)
+                except BchDecodingFailure:
+                    pass
+    return run
+
+def bch_encode():
+    bch = BCH(10, 1003, 2, 0)
+    rng = random.Random(0)
+    data = [rng.getrandbits(bch.k) for _ in range(100)]
+    format_bch = BCH(4, 5, 3, 0)
+
+    def run():
+        for word in data:
+            bch.encode(word)
+        for _ in range(20):
+            for format_data in range(32):
+                format_bch.encode(format_data)
+    return run
+
+def rs_block_decode():
+    rs_code = ReedSolomon(8, 26, 16, 4)
+    codeword = [32, 91, 11, 120, 209, 114, 220, 77, 67, 64, 236, 17, 236, 17, 236, 17,
+            196, 35, 39, 119, 235, 215, 231, 226, 93, 23]
+    received = []
+    for nb_errors in range(5):
+        word = list(codeword)
+        for i in range(nb_errors):
+            word[5 * i + 3] ^= 17 * (i + 1)
+        received.append(word)
+
+    def run():
+        for word in received:
+            rs_code.decode(word)
+    return run
+
+def rs_syndromes(batch):
+    """Syndromes of 1000 blocks of 100 codewords (30 EC codewords), one by one or batched"""
+
+    rng = random.Random(0)
+    blocks = [[rng.randrange(256) for _ in range(100)] for _ in range(1000)]
+
+    if not batch:
+        rs_code = ReedSolomon(8, 100, 70)
+        return lambda: [rs_code.syndromes(block) for block in blocks]
+
+    gfa = BinaryGaloisFieldArray(8)
+    polys = gfa.array(blocks)[:, ::-1]
+    points = gfa.gf.log_to_vector[:30]
+    return lambda: gfa.poly_eval(polys, points)
+
+WORKLOADS = {
+    'gf16_ops': lambda: gf_ops(4),
+    'gf256_ops': lambda: gf_ops(8),
+    'gf4096_ops': lambda: gf_ops(12),
+    'gf256_poly': lambda: gf_poly(8),
+    'gf4096_poly': lambda: gf_poly(12),
+    'bch_format_decode': bch_format_decode,
+    'bch_encode': bch_encode,
+    'rs_block_decode': rs_block_decode,
+    'rs_syndromes_scalar': lambda: rs_syndromes(False),
+    'rs_syndromes_array': lambda: rs_syndromes(True),
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=7,
+            help="number of runs of each workload, the best one is kept (default: 7)")
+    parser.add_argument('workloads', nargs='*', default=list(WORKLOADS),
+            help="workloads to run (default: all)")
+    args = parser.parse_args(argv)
+
+    for name in args.workloads:
+        run = WORKLOADS[name]()
+        # The first run builds the tables of the field
+        run()
+        durations = []
+        for _ in range(args.repeat):
+            start = perf_counter_ns()
+            run()
+            durations.append(perf_counter_ns() - start)
+        print(f"{name:<20}{min(durations) / 1e6:>10.2f}ms")
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
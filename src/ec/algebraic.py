@@ -0,0 +1,103 @@
+"""Algebraic decoding steps shared by the BCH and Reed-Solomon codes
+
+They all work on GF(2^m) polynomials given as lists of coefficients,
+the one of degree i being at index i.
+"""
+
+class DecodingFailure(Exception):
+    pass
+
+def berlekamp_massey(gf, syndromes):
+    """Implements the Berlekamp-Massey algorithm
+
+    This algo is used to compute sigma(x), the error locator polynomial.
+    The inverse-roots of this polynomial give us the location of the errors.
+    """
+
+    sigma = [1] # Current error locator polynomial called sigma(x)
+    sigma_old = sigma # Previous sigma
+
+    lfsr_len = 0 # Current length of the LFSR
+    discrep_old = 1 # Previous discrepency
+    l = 1 # Amount of shift in update (syndnum - m)
+
+    for syndnum in range(1, len(syndromes) + 1):
+        # Compute discrepency
+        sum_ = gf.gf_sum([gf.gf_mul(sigma[i], syndromes[syndnum - i - 1]) \
+                for i in range(1, lfsr_len + 1)])
+        discrep = syndromes[syndnum - 1] ^ sum_
+
+        # No change in polynomial
+        if not discrep:
+            l = l + 1
+            continue
+
+        # Change in polynomial
+
+        sigma_backup = sigma
+        coeff = gf.gf_mul(discrep, gf.gf_inv(discrep_old))
+        coeff_x_l = [0] * l + [coeff] # Create a polynomial of degree l equaling to coeff*X^l
+        sigma = gf.gf_poly_add(sigma, gf.gf_poly_mul(coeff_x_l, sigma_old))
+
+        # No-length change in update
+        if 2 * lfsr_len >= syndnum:
+            l = l + 1
+            continue
+
+        # Update with length change
+        lfsr_len = syndnum - lfsr_len
+        sigma_old = sigma_backup
+        discrep_old = discrep
+        l = 1
+    return sigma
+
+def brute_force_search(gf, sigma):
+    """Implement a naive Brute Force Search for roots
+
+    This algo is to determine the roots of polynomials defined over a finite field.
+    We can use it to find the roots of the error-locator polynomials for BCH or RS codes.
+    The inverse of those roots are called the error locators.
+    """
+
+    return [i for i in range(1, gf.n + 1) if not gf.gf_poly_eval(sigma, i)]
+
+def chien_search_exponents(gf, sigma):
+    """Implement the Chien Search (of 錢天問, Robert Tienwen CHIEN), giving the roots as powers of alpha
+
+    This is a fast algo for determining roots of polynomials defined over a finite field.
+    The error locator of root alpha^i is alpha^(n-i): no logarithm is needed
+    to get the error positions (logarithms are slow without tables).
+    """
+
+    exponents = []
+
+    compute = sigma[1:]
+    mul = [gf.gf_exp(exponent) for exponent in range(1, len(sigma))]
+
+    for i in range (0, gf.n):
+        sum_ = gf.gf_sum(compute)
+        if sum_ == 1:
+            exponents.append(i)
+
+        compute = [gf.gf_mul(compute[x], mul[x]) for x in range(len(compute))]
+    return exponents
+
+def forney(gf, syndromes, sigma, roots):
+    """Implement the Forney algorithm
+
+    It computes the error magnitudes from the roots of the error locator polynomial.
+    The syndromes are S_0, S_1, ... (the first root of the generator polynomial
+    is alpha^0), so the error magnitude for locator X is: X * omega(X^-1) / sigma'(X^-1)
+    """
+
+    # Error evaluator polynomial: omega(x) = S(x) * sigma(x) mod x^(n-k)
+    omega = gf.gf_poly_mul(syndromes, sigma)[:len(syndromes)]
+
+    # Formal derivative of sigma(x): in GF(2^m), even degree terms vanish
+    sigma_deriv = [coeff if deg & 1 else 0 for deg, coeff in enumerate(sigma)][1:]
+
+    magnitudes = []
+    for root in roots:
+        numerator = gf.gf_mul(gf.gf_inv(root), gf.gf_poly_eval(omega, root))
+        magnitudes.append(gf.gf_div(numerator, gf.gf_poly_eval(sigma_deriv, root)))
+    return magnitudes
@@ -1,17 +1,166 @@
-from ec.galois import BinaryGaloisField
+from functools import lru_cache
+from itertools import combinations
+from math import comb
 
-class BchDecodingFailure(Exception):
+from ec import algebraic
+from ec.galois import TABLES_MEMORY_BUDGET, galois_field
+
+class BchDecodingFailure(algebraic.DecodingFailure):
     pass
 
+def binary_poly_mul(poly1, poly2):
+    """Multiply 2 GF(2) polynomials (bit i of the ints is the coefficient of x^i)"""
+
+    res = 0
+    while poly2:
+        if poly2 & 1:
+            res ^= poly1
+        poly1 <<= 1
+        poly2 >>= 1
+    return res
+
+def binary_poly_mod(poly, divisor):
+    """Remainder of the division of 2 GF(2) polynomials"""
+
+    if not divisor:
+        raise ZeroDivisionError()
+
+    divisor_degree = divisor.bit_length() - 1
+    while poly.bit_length() > divisor_degree:
+        poly ^= divisor << (poly.bit_length() - 1 - divisor_degree)
+    return poly
+
+@lru_cache(maxsize=None)
+def generator_polynomial(m, t):
+    """Compute the generator polynomial of the t-errors correcting BCH code over GF(2^m)
+
+    It is the least common multiple of the minimal polynomials of alpha, alpha^2,
+    ..., alpha^2t. The minimal polynomial of alpha^j has for roots the powers
+    alpha^c of the cyclotomic coset of j: {j, 2j, 4j, ...} (mod n), so the
+    product of the distinct cosets' roots gives the least common multiple.
+    """
+
+    gf = galois_field(m)
+    generator = 1
+    covered = set()
+
+    for j in range(1, 2 * t + 1):
+        if j % gf.n in covered:
+            continue
+
+        coset = []
+        c = j % gf.n
+        while c not in coset:
+            coset.append(c)
+            c = 2 * c % gf.n
+        covered.update(coset)
+
+        # Product of the (x - alpha^c): its coefficients are all 0 or 1
+        minimal_poly = [1]
+        for c in coset:
+            minimal_poly = gf.gf_poly_mul(minimal_poly, [gf.gf_exp(c), 1])
+        minimal_poly = sum(coeff << deg for deg, coeff in enumerate(minimal_poly))
+
+        generator = binary_poly_mul(generator, minimal_poly)
+    return generator
+
+class CyclicEncoder:
+    """Systematic encoder of a binary (n, k) cyclic code, given its generator polynomial g
+
+    The code may be shortened: any n > deg(g) is accepted, so codes which
+    aren't primitive narrow-sense BCH codes (like the QR Code (18, 6) version
+    information code) can be encoded as well. Data and codewords are ints:
+    bit i is the coefficient of x^i.
+    """
+
+    def __init__(self, n, k, g):
+        if g.bit_length() - 1 != n - k:
+            raise ValueError(f"The generator polynomial of a ({n}, {k}) code must be of degree {n - k}")
+
+        self.n = n
+        self.k = k
+        self.g = g
+        self.table = [binary_poly_mod(value << (n - k), g) for value in range(256)]
+
+    def encode(self, data):
+        """Systematic encoding of the k bits of data
+
+        The codeword is data * x^(n-k) plus its remainder by g, which is
+        computed like a CRC: byte per byte (most significant first), each one
+        folding the remainder through a 256-entry table of (v * x^(n-k)) mod g.
+        """
+
+        if data >> self.k:
+            raise ValueError(f"The data doesn't fit in {self.k} bits")
+
+        shift = self.n - self.k
+        remainder_mask = (1 << shift) - 1
+        remainder = 0
+        for byte in data.to_bytes((self.k + 7) // 8, 'big'):
+            # (remainder * x^8 + byte * x^(n-k)) mod g
+            shifted = (remainder << 8) ^ (byte << shift)
+            remainder = (shifted & remainder_mask) ^ self.table[shifted >> shift]
+
+        return (data << shift) | remainder
+
 class BCH:
-    """t-errors correcting Primitive Narrow-sense BCH (2^m - 1, k)"""
+    """t-errors correcting Primitive Narrow-sense BCH (2^m - 1, k)
+
+    The generator polynomial g is computed from m and t (when given, g is
+    checked against it). Codewords are ints: bit i is the coefficient of x^i.
+    Short codes are decoded with a table of all the correctable error patterns
+    (see generate_error_table), if it has at most error_table_max_size entries.
+    The others are decoded algebraically (Berlekamp-Massey and Chien search).
+    """
+
+    # Largest memory footprint (in bytes) allowed for the syndrome tables
+    SYNDROME_TABLES_MEMORY_BUDGET = TABLES_MEMORY_BUDGET
 
-    def __init__(self, m, k, t, g):
+    # Default size budget (number of entries) of the error table
+    ERROR_TABLE_MAX_SIZE = 1 << 16
+
+    def __init__(self, m, k, t, g, error_table_max_size=None):
+        self.m = m
         self.n = 2**m - 1
         self.k = k
         self.t = t
-        self.g = g
-        self.gf = BinaryGaloisField(m)
+        self.gf = galois_field(m)
+        self.g = self.generator_polynomial(g)
+
+        self.encoder = None # Generated on first use
+
+        # Syndrome tables, generated on first use (if they fit in memory)
+        self.syndrome_positions = None
+        self.syndrome_byte_tables = None
+        self.n_mask = (1 << self.n) - 1
+        self.use_syndrome_positions = \
+                self.syndrome_tables_memory(False) <= self.SYNDROME_TABLES_MEMORY_BUDGET
+        self.use_syndrome_byte_tables = \
+                self.syndrome_tables_memory(True) <= self.SYNDROME_TABLES_MEMORY_BUDGET
+
+        if error_table_max_size is None:
+            error_table_max_size = self.ERROR_TABLE_MAX_SIZE
+        self.use_error_table = self.error_table_size() <= error_table_max_size
+        self.error_table = None # Generated on first use
+
+    def generator_polynomial(self, g):
+        """Compute the generator polynomial, check g and k against it (if g is given)"""
+
+        generator = generator_polynomial(self.m, self.t)
+
+        if g and g != generator:
+            raise ValueError(f"The generator polynomial of this code is {generator:#b}, not {g:#b}")
+        if self.k != self.n - (generator.bit_length() - 1):
+            raise ValueError(f"The length of the message must be {self.n - (generator.bit_length() - 1)}")
+
+        return generator
+
+    def encode(self, data):
+        """Systematic encoding of the k bits of data (see CyclicEncoder)"""
+
+        if self.encoder is None:
+            self.encoder = CyclicEncoder(self.n, self.k, self.g)
+        return self.encoder.encode(data)
 
     def binary_to_list(self, n):
         return list(reversed([1 if digit=='1' else 0 for digit in bin(n)[2:]]))
@@ -20,118 +169,191 @@ class BCH:
         return int(''.join(map(str, l)), 2)
 
     def syndrome(self, j, r):
+        if 1 <= j <= 2 * self.t:
+            return self.syndromes_packed(r) >> (self.m * (j - 1)) & self.n
+
         poly = self.binary_to_list(r)
         return self.gf.gf_poly_eval(poly, self.gf.gf_pow(2, j))
 
     def syndromes(self, r):
-        s = [0] * (2 * self.t)
-
-        for j in range(len(s)):
-            s[j] = self.syndrome(j + 1, r)
-        return s
-
-    def berlekamp_massey(self, syndromes):
-        """Implements the Berlekamp-Massey algorithm
-
-        This algo is used to compute sigma(x), the error locator polynomial.
-        The inverse-roots of this polynomial give us the location of the errors.
-        """
+        return self.unpack_syndromes(self.syndromes_packed(r))
 
-        sigma = [1] # Current error locator polynomial called sigma(x)
-        sigma_old = sigma # Previous sigma
+    def unpack_syndromes(self, packed):
+        """Split packed syndromes into the list [S1, S2, ..., S2t]"""
 
-        lfsr_len = 0 # Current length of the LFSR
-        discrep_old = 1 # Previous discrepency
-        l = 1 # Amount of shift in update (syndnum - m)
+        m, mask = self.m, self.n
+        return [packed >> (m * j) & mask for j in range(2 * self.t)]
 
-        for syndnum in range(1, len(syndromes) + 1):
-            # Compute discrepency
-            sum_ = self.gf.gf_sum([self.gf.gf_mul(sigma[i], syndromes[syndnum - i - 1]) \
-                    for i in range(1, lfsr_len + 1)])
-            discrep = syndromes[syndnum - 1] ^ sum_
+    def syndrome_tables_memory(self, byte_tables):
+        """Estimate the memory footprint (in bytes) of the syndrome tables
 
-            # No change in polynomial
-            if not discrep:
-                l = l + 1
-                continue
+        Each entry is a list slot (8 bytes) and an int object of 2tm bits.
+        With byte_tables, the byte-wise tables are counted along the per-bit one.
+        """
 
-            # Change in polynomial
+        entry_memory = 8 + 28 + 4 * ((2 * self.t * self.m + 29) // 30)
+        nb_entries = self.n
+        if byte_tables:
+            nb_entries += (self.n + 7) // 8 * 256
+        return nb_entries * entry_memory
 
-            sigma_backup = sigma
-            coeff = self.gf.gf_mul(discrep, self.gf.gf_inv(discrep_old))
-            coeff_x_l = [0] * l + [coeff] # Create a polynomial of degree l equaling to coeff*X^l
-            sigma = self.gf.gf_poly_add(sigma, self.gf.gf_poly_mul(coeff_x_l, sigma_old))
+    def position_syndromes(self, alpha_i):
+        """Get the syndromes of the single bit r = x^i, from alpha^i, packed in one int
 
-            # No-length change in update
-            if 2 * lfsr_len >= syndnum:
-                l = l + 1
-                continue
+        S_j, that is alpha^(i*j), is at bits m*(j-1) to m*j-1.
+        """
 
-            # Update with length change
-            lfsr_len = syndnum - lfsr_len
-            sigma_old = sigma_backup
-            discrep_old = discrep
-            l = 1
-        return sigma
+        packed, power = 0, alpha_i
+        for j in range(2 * self.t):
+            packed |= power << (self.m * j)
+            power = self.gf.gf_mul(power, alpha_i)
+        return packed
+
+    def generate_syndrome_positions(self):
+        """Get the syndromes of each single bit r = x^i (see position_syndromes)"""
+
+        positions = []
+        alpha_i = 1
+        for _ in range(self.n):
+            positions.append(self.position_syndromes(alpha_i))
+            alpha_i = self.gf.gf_mul(alpha_i, 2)
+        return positions
+
+    def generate_syndrome_tables(self):
+        """Generate the tables of syndromes_packed
+
+        - syndrome_positions: the syndromes of each single bit (see position_syndromes)
+        - syndrome_byte_tables: the syndromes of each byte value at each byte
+        position of r
+        Each of them is only generated if it fits in SYNDROME_TABLES_MEMORY_BUDGET.
+        """
 
-    def brute_force_search(self, sigma):
-        """Implement a naive Brute Force Search for roots
+        positions = self.generate_syndrome_positions()
+        self.syndrome_positions = positions
+
+        if not self.use_syndrome_byte_tables:
+            return
+
+        byte_tables = []
+        for offset in range(0, self.n, 8):
+            table = [0]
+            for packed in positions[offset:offset + 8]:
+                table += [syndromes ^ packed for syndromes in table]
+            # Bits past the end of the code (if any) don't have any syndrome
+            table *= 256 // len(table)
+            byte_tables.append(table)
+        self.syndrome_byte_tables = byte_tables
+
+    def syndromes_packed(self, r):
+        """Compute the 2t syndromes of r, packed in one int (see unpack_syndromes)
+
+        The syndromes of r are the XOR of the syndromes of its bits: they are
+        looked up byte per byte in precomputed tables. When the tables don't
+        fit in memory, the syndromes of the bits are looked up one by one, or
+        even computed directly.
+        """
 
-        This algo is to determine the roots of polynomials defined over a finite field.
-        We can use it to find the roots of the error-locator polynomials for BCH or RS codes.
-        The inverse of those roots are called the error locators.
+        if self.use_syndrome_positions and self.syndrome_positions is None:
+            self.generate_syndrome_tables()
+
+        # alpha^n = 1: bits past the length of the code wrap around
+        while r >> self.n:
+            r = (r & self.n_mask) ^ (r >> self.n)
+
+        syndromes = 0
+        byte_tables = self.syndrome_byte_tables
+        if byte_tables is not None:
+            for table in byte_tables:
+                if not r:
+                    break
+                syndromes ^= table[r & 0xFF]
+                r >>= 8
+            return syndromes
+
+        # Long codes: one lookup (or computation) per set bit
+        positions = self.syndrome_positions
+        while r:
+            lowest_bit = r & -r
+            i = lowest_bit.bit_length() - 1
+            if positions is not None:
+                syndromes ^= positions[i]
+            else:
+                syndromes ^= self.position_syndromes(self.gf.gf_exp(i))
+            r ^= lowest_bit
+        return syndromes
+
+    def error_table_size(self):
+        """Number of error patterns of weight 1 to t"""
+
+        return sum(comb(self.n, weight) for weight in range(1, self.t + 1))
+
+    def generate_error_table(self):
+        """Map the (packed) syndromes of every error pattern of weight 1 to t to that pattern
+
+        The syndromes of a pattern are the XOR of the syndromes of its bits.
+        As the code corrects t errors, no two patterns share their syndromes.
         """
 
-        roots = []
+        positions = self.syndrome_positions
+        if positions is None:
+            positions = self.generate_syndrome_positions()
 
-        for i in range (1, self.n + 1):
-            if not self.gf.gf_poly_eval(sigma, i):
-                roots.append(i)
-        return roots
+        error_table = {}
+        for weight in range(1, self.t + 1):
+            for indexes in combinations(range(self.n), weight):
+                syndromes, error = 0, 0
+                for idx in indexes:
+                    syndromes ^= positions[idx]
+                    error |= 1 << idx
+                error_table[syndromes] = error
+        return error_table
 
+    def berlekamp_massey(self, syndromes):
+        return algebraic.berlekamp_massey(self.gf, syndromes)
 
-    def chien_search(self, sigma):
-        """Implement the Chien Search (of 錢天問, Robert Tienwen CHIEN)
+    def brute_force_search(self, sigma):
+        return algebraic.brute_force_search(self.gf, sigma)
 
-        This is a fast algo for determining roots of polynomials defined over a finite field.
-        We can use it to find the roots of the error-locator polynomials for BCH or RS codes.
-        The inverse of those roots are called the error locators.
-        """
+    def chien_search(self, sigma):
+        return [self.gf.gf_exp(i) for i in self.chien_search_exponents(sigma)]
 
-        roots = []
+    def chien_search_exponents(self, sigma):
+        return algebraic.chien_search_exponents(self.gf, sigma)
 
-        compute = sigma[1:]
-        mul = [self.gf.log_to_vector[exponent] for exponent in range(1, len(sigma))]
+    def decode(self, r):
+        syndromes = self.syndromes_packed(r)
 
-        for i in range (0, self.n):
-            sum_ = self.gf.gf_sum(compute)
-            if sum_ == 1:
-                roots.append(self.gf.log_to_vector[i])
+        errors_detected = syndromes != 0
 
-            compute = [self.gf.gf_mul(compute[x], mul[x]) for x in range(len(compute))]
-        return roots
+        if not errors_detected:
+            return errors_detected, r
 
+        if self.use_error_table:
+            if self.error_table is None:
+                self.error_table = self.generate_error_table()
 
-    def decode(self, r):
-        syndromes = self.syndromes(r)
+            error = self.error_table.get(syndromes)
+            if error is None:
+                raise BchDecodingFailure("Too many errors")
+            return errors_detected, r ^ error
 
-        errors_detected = sum(syndromes) != 0
+        return errors_detected, self.decode_algebraic(r, syndromes)
 
-        if not errors_detected:
-            return errors_detected, r
+    def decode_algebraic(self, r, syndromes):
+        """Correct r (with non-null packed syndromes) with Berlekamp-Massey and Chien search"""
 
-        error_locator_poly = self.berlekamp_massey(syndromes)
+        error_locator_poly = self.berlekamp_massey(self.unpack_syndromes(syndromes))
 
         if len(error_locator_poly) - 1 > self.t:
             raise BchDecodingFailure("Too many errors")
 
-        error_locator_poly_roots = self.chien_search(error_locator_poly)
+        roots_exponents = self.chien_search_exponents(error_locator_poly)
 
-        if len(error_locator_poly_roots) != len(error_locator_poly) - 1:
+        if len(roots_exponents) != len(error_locator_poly) - 1:
             raise BchDecodingFailure("Too many errors")
 
-        error_locators = [self.gf.gf_inv(j) for j in error_locator_poly_roots]
-        error_indexes = [self.gf.vector_to_log[j] for j in error_locators]
+        # The error locators are the inverses of the roots
+        error_indexes = [(self.n - i) % self.n for i in roots_exponents]
 
         correction = 0
         for error_idx in error_indexes:
@@ -139,8 +361,7 @@ class BCH:
 
         corrected = r ^ correction
 
-        syndromes_after_correction = self.syndromes(corrected)
-        if sum(syndromes_after_correction):
+        if self.syndromes_packed(corrected):
             raise BchDecodingFailure("Syndromes not null after correction")
 
-        return errors_detected, corrected
+        return corrected
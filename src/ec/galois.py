@@ -1,4 +1,5 @@
 from functools import reduce
+from operator import xor
 
 # As this module is essentially dealing with pure mathematics, let's allow
 # ourselves to use variables of one character length, like "x", "y", etc.
@@ -25,7 +26,11 @@ class BinaryGaloisField:
             0b1000010001,
             0b10000001001,
             0b100000000101,
-            0b1000001010011
+            0b1000001010011,
+            0b10000000011011,
+            0b100010001000011,
+            0b1000000000000011,
+            0b10001000000001011
     ]
 
     M_MIN, M_MAX = (3, len(PRIMITIVE_POLY) + 2)
@@ -33,11 +38,16 @@ class BinaryGaloisField:
     LOG_TO_VECTOR_TABLES = [[]] * len(PRIMITIVE_POLY)
     VECTOR_TO_LOG_TABLES = [[]] * len(PRIMITIVE_POLY)
 
+    # Acceleration tables (see generate_acceleration_tables)
+    EXP_TABLES = [None] * len(PRIMITIVE_POLY)
+    INV_TABLES = [None] * len(PRIMITIVE_POLY)
+    MUL_TABLES = [None] * len(PRIMITIVE_POLY)
+
+    # Full multiplication tables are only built for the small fields
+    MUL_TABLE_M_MAX = 8
+
     def __init__(self, m):
-        if m < self.M_MIN:
-            raise ValueError(f"The exponent m must be greater or equal to {self.M_MIN}")
-        if m > self.M_MAX:
-            raise ValueError(f"Exponent m greater than {self.M_MAX} are not supported")
+        self.check_m(m)
 
         self.m = m
         self.n = 2**m - 1
@@ -53,6 +63,32 @@ class BinaryGaloisField:
             self.VECTOR_TO_LOG_TABLES[m - self.M_MIN] = self.generate_vector_to_log()
         self.vector_to_log = self.VECTOR_TO_LOG_TABLES[m - self.M_MIN]
 
+        if self.EXP_TABLES[m - self.M_MIN] is None:
+            self.EXP_TABLES[m - self.M_MIN], self.INV_TABLES[m - self.M_MIN], \
+                    self.MUL_TABLES[m - self.M_MIN] = self.generate_acceleration_tables()
+        self.exp_table = self.EXP_TABLES[m - self.M_MIN]
+        self.inv_table = self.INV_TABLES[m - self.M_MIN]
+        self.mul_table = self.MUL_TABLES[m - self.M_MIN]
+
+    @classmethod
+    def check_m(cls, m):
+        if m < cls.M_MIN:
+            raise ValueError(f"The exponent m must be greater or equal to {cls.M_MIN}")
+        if m > cls.M_MAX:
+            raise ValueError(f"Exponent m greater than {cls.M_MAX} are not supported")
+
+    @classmethod
+    def tables_memory(cls, m):
+        """Estimate the memory footprint (in bytes) of the tables of GF(2^m)
+
+        The log and acceleration tables hold 5 list slots (8 bytes) per number,
+        and about 2 int objects (32 bytes) per number are their own.
+        """
+
+        memory = 2**m * (5 * 8 + 2 * 32)
+        if m <= cls.MUL_TABLE_M_MAX:
+            memory += 4**m * 8
+        return memory
 
     def generate_log_to_vector(self):
         m = self.m
@@ -80,13 +116,48 @@ class BinaryGaloisField:
 
         return vector_to_log
 
+    def generate_acceleration_tables(self):
+        """Generate the tables that spare the modulos and branches of the operations
+
+        - exp_table: log_to_vector, twice in a row: the sum of two logs can index it
+        - inv_table: inverse of each number (0 for 0)
+        - mul_table: for small fields, the product of x and y is mul_table[x][y]
+
+        They are plain lists: indexing them is faster than indexing bytes or arrays.
+        """
+
+        exp_table = self.log_to_vector * 2
+        inv_table = [0] + [exp_table[self.n - self.vector_to_log[x]] \
+                for x in range(1, self.n + 1)]
+
+        if self.m > self.MUL_TABLE_M_MAX:
+            return exp_table, inv_table, None
+
+        logs = self.vector_to_log[1:]
+        mul_table = [[0] * (self.n + 1)] + [[0] + [exp_table[x_log + y_log] for y_log in logs] \
+                for x_log in logs]
+        return exp_table, inv_table, mul_table
+
+    def gf_exp(self, exponent):
+        """Compute alpha^exponent"""
+
+        return self.log_to_vector[exponent % self.n]
+
+    def gf_log(self, x):
+        """Compute the power of alpha that equals x (not 0)"""
+
+        if not x:
+            raise ValueError("0 has no logarithm")
+
+        return self.vector_to_log[x]
+
     # Note that gf_add and gf_sub are both the same as a XOR (^ operator)
 
     @staticmethod
     def gf_sum(list_to_sum):
         """Implement the summation of GF(2^m) numbers"""
 
-        return reduce(lambda x, y: x ^ y, list_to_sum, 0)
+        return reduce(xor, list_to_sum, 0)
 
     def gf_mul(self, x, y):
         """Multiply 2 GF(2^m) number together
@@ -94,11 +165,13 @@ class BinaryGaloisField:
         To multiply 2 GF number, we can convert it to alpha notation and add their powers together.
         Finally, we convert it back to the vector notation
         """
+        if self.mul_table is not None:
+            return self.mul_table[x][y]
+
         if not x or not y:
             return 0
 
-        exponent = (self.vector_to_log[x] + self.vector_to_log[y]) % self.n
-        return self.log_to_vector[exponent]
+        return self.exp_table[self.vector_to_log[x] + self.vector_to_log[y]]
 
     def gf_div(self, x, y):
         """Divide 2 GF(2^m) number together
@@ -112,8 +185,7 @@ class BinaryGaloisField:
         if not x:
             return 0
 
-        exponent = (self.vector_to_log[x] + self.n  - self.vector_to_log[y]) % self.n
-        return self.log_to_vector[exponent]
+        return self.exp_table[self.vector_to_log[x] + self.n - self.vector_to_log[y]]
 
     def gf_pow(self, x, power):
         """Compute the power of a GF(2^m) number
@@ -142,17 +214,24 @@ class BinaryGaloisField:
         if not x:
             raise ZeroDivisionError()
 
-        return self.log_to_vector[(self.n - self.vector_to_log[x]) % self.n]
+        return self.inv_table[x]
 
     def gf_poly_scale(self, poly, x):
         """Multiply (in GF(2^m)) a polynomial with a constant"""
 
-        res_poly = [0] * len(poly)
+        if self.mul_table is not None:
+            return list(map(self.mul_table[x].__getitem__, poly))
 
-        for idx, coeff in enumerate(poly):
-            res_poly[idx] = self.gf_mul(x, coeff)
+        if not x:
+            return [0] * len(poly)
 
-        return res_poly
+        return self.gf_poly_scale_log(poly, self.vector_to_log[x])
+
+    def gf_poly_scale_log(self, poly, x_log):
+        """Multiply (in GF(2^m)) a polynomial with a constant given by its log (alpha power)"""
+
+        exp_table, vector_to_log = self.exp_table, self.vector_to_log
+        return [exp_table[vector_to_log[coeff] + x_log] if coeff else 0 for coeff in poly]
 
     @staticmethod
     def gf_poly_add(poly1, poly2):
@@ -174,16 +253,133 @@ class BinaryGaloisField:
         res_poly = [0] * (len(poly1) + len(poly2) - 1)
 
         for deg1, coeff1 in enumerate(poly1):
-            for deg2, coeff2 in enumerate(poly2):
-                res_poly[deg1 + deg2] ^= self.gf_mul(coeff1, coeff2)
+            if not coeff1:
+                continue
+            for deg2, product in enumerate(self.gf_poly_scale(poly2, coeff1), deg1):
+                res_poly[deg2] ^= product
 
         return res_poly
 
     def gf_poly_eval(self, poly, x):
         """Evaluate a polynomial at a particular value x"""
 
+        if self.mul_table is None:
+            if not x:
+                return poly[0]
+            return self.gf_poly_eval_log(poly, self.vector_to_log[x])
+
+        mul_x = self.mul_table[x]
+        res = poly[-1]
+        for idx in range(len(poly) - 2, -1, -1):
+            res = mul_x[res] ^ poly[idx]
+
+        return res
+
+    def gf_poly_eval_log(self, poly, x_log):
+        """Evaluate a polynomial at a particular value given by its log (alpha power)"""
+
+        exp_table, vector_to_log = self.exp_table, self.vector_to_log
+        res = poly[-1]
+        for idx in range(len(poly) - 2, -1, -1):
+            res = (exp_table[vector_to_log[res] + x_log] if res else 0) ^ poly[idx]
+
+        return res
+
+
+class CarrylessBinaryGaloisField(BinaryGaloisField):
+    """Binary Galois Field without any table
+
+    Numbers are multiplied with a shift-and-XOR carry-less multiplication,
+    reduced by the primitive polynomial along the way. Everything else derives
+    from it: powers by square-and-multiply, and the inverse of x is x^(n-1).
+    Nothing is precomputed, which suits the large fields (up to GF(2^16))
+    whose tables would take a lot of memory and time to generate.
+    Only logarithms are slow: they are found by exhaustive search.
+    """
+
+    # pylint: disable=super-init-not-called
+    def __init__(self, m):
+        self.check_m(m)
+
+        self.m = m
+        self.n = 2**m - 1
+        self.primitive_poly = self.PRIMITIVE_POLY[m - self.M_MIN]
+
+    def gf_exp(self, exponent):
+        return self.gf_pow(2, exponent)
+
+    def gf_log(self, x):
+        if not x:
+            raise ValueError("0 has no logarithm")
+
+        power = 1
+        for exponent in range(self.n):
+            if power == x:
+                return exponent
+            power = self.gf_mul(power, 2)
+
+        raise ValueError(f"{x} is not a number of GF(2^{self.m})")
+
+    def gf_mul(self, x, y):
+        m_bit = 1 << self.m
+        primitive_poly = self.primitive_poly
+
+        res = 0
+        while y:
+            if y & 1:
+                res ^= x
+            y >>= 1
+            x <<= 1
+            # Replace alpha^m by its simplification
+            if x & m_bit:
+                x ^= primitive_poly
+        return res
+
+    def gf_div(self, x, y):
+        return self.gf_mul(x, self.gf_inv(y))
+
+    def gf_pow(self, x, power):
+        if not x:
+            return 0 if power else 1
+
+        power %= self.n
+        res = 1
+        while power:
+            if power & 1:
+                res = self.gf_mul(res, x)
+            x = self.gf_mul(x, x)
+            power >>= 1
+        return res
+
+    def gf_inv(self, x):
+        if not x:
+            raise ZeroDivisionError()
+
+        return self.gf_pow(x, self.n - 1)
+
+    def gf_poly_scale(self, poly, x):
+        return [self.gf_mul(x, coeff) for coeff in poly]
+
+    def gf_poly_scale_log(self, poly, x_log):
+        return self.gf_poly_scale(poly, self.gf_exp(x_log))
+
+    def gf_poly_eval(self, poly, x):
         res = poly[-1]
         for idx in range(len(poly) - 2, -1, -1):
             res = self.gf_mul(res, x) ^ poly[idx]
 
         return res
+
+    def gf_poly_eval_log(self, poly, x_log):
+        return self.gf_poly_eval(poly, self.gf_exp(x_log))
+
+
+# Largest memory footprint (in bytes) allowed for the tables of a field
+TABLES_MEMORY_BUDGET = 1 << 20
+
+def galois_field(m, memory_budget=TABLES_MEMORY_BUDGET):
+    """Get GF(2^m): with tables if they fit in memory_budget, carry-less otherwise"""
+
+    if BinaryGaloisField.tables_memory(m) <= memory_budget:
+        return BinaryGaloisField(m)
+    return CarrylessBinaryGaloisField(m)
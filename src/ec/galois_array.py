@@ -0,0 +1,95 @@
+from ec.galois import BinaryGaloisField
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# pylint: disable=invalid-name
+
+class BinaryGaloisFieldArray:
+    """Element-wise GF(2^m) arithmetic over NumPy arrays
+
+    This is the array counterpart of BinaryGaloisField (whose log and exp
+    tables it reuses): every operation gives the same results as the scalar
+    method, for every element of its (broadcast) operands.
+    Results are arrays of uint16.
+    Polynomials follow the same convention as the scalar API: the coefficient
+    of degree i is at index i (of the last axis).
+    """
+
+    def __init__(self, m):
+        if np is None:
+            raise ImportError("NumPy is needed for GF(2^m) array arithmetic")
+
+        self.gf = BinaryGaloisField(m)
+        self.m = m
+        self.n = self.gf.n
+
+        # Doubled exp table: the sum of two logs can index it without modulo
+        self.exp = np.array(self.gf.exp_table, dtype=np.uint16)
+        # The log of 0 doesn't exist: it is set to 0, zeroes are handled apart
+        self.log = np.array(self.gf.vector_to_log, dtype=np.intp)
+        self.log[0] = 0
+
+    def array(self, x):
+        return np.asarray(x, dtype=np.uint16)
+
+    def mul(self, x, y):
+        x, y = self.array(x), self.array(y)
+        return np.where((x != 0) & (y != 0), self.exp[self.log[x] + self.log[y]], 0) \
+                .astype(np.uint16)
+
+    def div(self, x, y):
+        x, y = self.array(x), self.array(y)
+        if not y.all():
+            raise ZeroDivisionError()
+        return np.where(x != 0, self.exp[self.log[x] + self.n - self.log[y]], 0) \
+                .astype(np.uint16)
+
+    def inv(self, x):
+        x = self.array(x)
+        if not x.all():
+            raise ZeroDivisionError()
+        return self.exp[self.n - self.log[x]]
+
+    def pow(self, x, power):
+        x = self.array(x)
+        power = np.asarray(power, dtype=np.intp)
+        res = self.exp[(self.log[x] * power) % self.n]
+        # 0^0 is 1, but any other power of 0 is 0
+        return np.where((x != 0) | (power == 0), res, 0).astype(np.uint16)
+
+    def poly_eval(self, polys, xs):
+        """Evaluate polynomials at many values at once
+
+        The result has the shape of polys (without its last axis) followed by
+        the shape of xs: res[..., j] is the evaluation of polys[...] at xs[j].
+        """
+
+        polys, xs = self.array(polys), self.array(xs)
+        coeffs = polys.reshape(polys.shape[:-1] + (1,) * xs.ndim + polys.shape[-1:])
+
+        # Multiplying by x is adding its log (the zeroes being masked out)
+        x_logs = self.log[xs]
+        x_nonzero = xs != 0
+
+        res = np.broadcast_to(coeffs[..., -1], polys.shape[:-1] + xs.shape).copy()
+        for deg in range(polys.shape[-1] - 2, -1, -1):
+            res = np.where(x_nonzero & (res != 0), self.exp[self.log[res] + x_logs], 0) \
+                    .astype(np.uint16) ^ coeffs[..., deg]
+
+        return res
+
+    def poly_mul(self, polys1, polys2):
+        """Multiply polynomials pairwise (along their leading, broadcast, axes)"""
+
+        polys1, polys2 = self.array(polys1), self.array(polys2)
+        len1, len2 = polys1.shape[-1], polys2.shape[-1]
+        shape = np.broadcast_shapes(polys1.shape[:-1], polys2.shape[:-1])
+
+        res = np.zeros(shape + (len1 + len2 - 1,), dtype=np.uint16)
+        for deg1 in range(len1):
+            res[..., deg1:deg1 + len2] ^= self.mul(polys1[..., deg1, None], polys2)
+
+        return res
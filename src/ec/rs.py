@@ -0,0 +1,119 @@
+from ec import algebraic
+from ec.galois import galois_field
+
+class ReedSolomonDecodingFailure(algebraic.DecodingFailure):
+    pass
+
+class ReedSolomon:
+    """t-errors correcting (shortened) Reed-Solomon (n, k) code over GF(2^m)
+
+    Codewords are sequences of n symbols of GF(2^m), the first symbol being
+    the coefficient of the highest degree term (this is the QR Code convention).
+    The roots of the generator polynomial are alpha^0, alpha^1, ..., alpha^(n-k-1).
+
+    By default, t is the maximum number of errors the code can correct, (n-k)/2.
+    It can be lowered to keep some redundancy for error detection only
+    (QR Code misdecode protection codewords).
+    """
+
+    def __init__(self, m, n, k, t=None):
+        if t is None:
+            t = (n - k) // 2
+        self.m = m
+        self.n = 2**m - 1
+        self.length = n
+        self.k = k
+        self.t = t
+        self.gf = galois_field(m)
+        self.g = self.generator_polynomial()
+
+    def generator_polynomial(self):
+        """Compute the generator polynomial (x - alpha^0)...(x - alpha^(n-k-1))
+
+        Its coefficients are GF(2^m) numbers, the one of degree i being at index i.
+        """
+
+        generator = [1]
+        for j in range(self.length - self.k):
+            generator = self.gf.gf_poly_mul(generator, [self.gf.gf_exp(j), 1])
+        return generator
+
+    def encode(self, data):
+        """Systematic encoding of the k data symbols: append the n-k EC symbols
+
+        The EC symbols are the remainder of data * x^(n-k) by the generator
+        polynomial, computed by long division (LFSR style).
+        """
+
+        if len(data) != self.k:
+            raise ValueError(f"The data must be {self.k} symbols long")
+
+        # Generator coefficients, highest degree first, without the leading 1
+        generator = self.g[-2::-1]
+
+        remainder = [0] * (self.length - self.k)
+        for symbol in data:
+            coeff = symbol ^ remainder[0]
+            remainder = remainder[1:] + [0]
+            if coeff:
+                remainder = [rem ^ product for rem, product \
+                        in zip(remainder, self.gf.gf_poly_scale(generator, coeff))]
+
+        return list(data) + remainder
+
+    def syndrome(self, j, r):
+        poly = list(reversed(r))
+        return self.gf.gf_poly_eval(poly, self.gf.gf_exp(j))
+
+    def syndromes(self, r):
+        poly = list(reversed(r))
+        return [self.gf.gf_poly_eval(poly, self.gf.gf_exp(j)) \
+                for j in range(self.length - self.k)]
+
+    def berlekamp_massey(self, syndromes):
+        return algebraic.berlekamp_massey(self.gf, syndromes)
+
+    def forney(self, syndromes, sigma, roots):
+        return algebraic.forney(self.gf, syndromes, sigma, roots)
+
+    def decode(self, r):
+        """Correct the received codeword r
+
+        Return the number of corrected errors and the corrected codeword (as a list).
+        """
+
+        syndromes = self.syndromes(r)
+
+        if not any(syndromes):
+            return 0, list(r)
+
+        error_locator_poly = self.berlekamp_massey(syndromes)
+
+        # Get rid of zero high degree terms (cancelled out during the iterations)
+        while len(error_locator_poly) > 1 and not error_locator_poly[-1]:
+            error_locator_poly.pop()
+
+        nb_errors = len(error_locator_poly) - 1
+        if nb_errors > self.t:
+            raise ReedSolomonDecodingFailure("Too many errors")
+
+        roots_exponents = algebraic.chien_search_exponents(self.gf, error_locator_poly)
+
+        if len(roots_exponents) != nb_errors:
+            raise ReedSolomonDecodingFailure("Too many errors")
+
+        roots = [self.gf.gf_exp(i) for i in roots_exponents]
+        magnitudes = self.forney(syndromes, error_locator_poly, roots)
+
+        corrected = list(r)
+        for root_exponent, magnitude in zip(roots_exponents, magnitudes):
+            # The error locator is the inverse of the root, its power is the error degree
+            error_degree = (self.n - root_exponent) % self.n
+            if error_degree >= self.length:
+                raise ReedSolomonDecodingFailure("Error located outside of the shortened codeword")
+            corrected[self.length - 1 - error_degree] ^= magnitude
+
+        if any(self.syndromes(corrected)):
+            raise ReedSolomonDecodingFailure("Syndromes not null after correction")
+
+        return nb_errors, corrected
@@ -0,0 +1,62 @@
+class BitReader:
+    """MSb first bit reader over a bytes-like object
+
+    Fields are read straight from the raw bytes with a bit cursor, without
+    any intermediate representation of the bitstream.
+    """
+
+    def __init__(self, data, bit_len=None):
+        self.data = memoryview(data).cast('B')
+        self.bit_len = len(self.data) * 8 if bit_len is None else bit_len
+        self.pos = 0
+
+        if self.bit_len > len(self.data) * 8:
+            raise ValueError("Bit length exceeds the data length")
+
+    @classmethod
+    def from_bitstring(cls, bitstring):
+        """Create a bit reader from a string of '0' and '1' (handy for tests)"""
+
+        bit_len = len(bitstring)
+        padding = -bit_len % 8
+        value = int(bitstring + '0' * padding, 2) if bit_len else 0
+        return cls(value.to_bytes((bit_len + padding) // 8, 'big'), bit_len)
+
+    def remaining(self):
+        return self.bit_len - self.pos
+
+    def peek_bits(self, n):
+        """Get the next n bits as an unsigned integer, without moving the cursor"""
+
+        pos = self.pos
+        end = pos + n
+        if end > self.bit_len:
+            raise ValueError("Bitstream exhausted")
+
+        # Only fetch the bytes spanned by the field
+        chunk = int.from_bytes(self.data[pos >> 3:(end + 7) >> 3], 'big')
+        return (chunk >> (-end % 8)) & ((1 << n) - 1)
+
+    def read_bits(self, n):
+        """Read the next n bits as an unsigned integer"""
+
+        bits = self.peek_bits(n)
+        self.pos += n
+        return bits
+
+    def read_bytes(self, count):
+        """Read the next count bytes (not necessarily byte-aligned)"""
+
+        pos = self.pos
+        end = pos + 8 * count
+        if end > self.bit_len:
+            raise ValueError("Bitstream exhausted")
+        self.pos = end
+
+        offset = pos & 7
+        if not offset:
+            return bytes(self.data[pos >> 3:end >> 3])
+
+        # Realign the spanned bytes on a byte boundary
+        chunk = int.from_bytes(self.data[pos >> 3:(end >> 3) + 1], 'big')
+        return ((chunk >> (8 - offset)) & ((1 << (8 * count)) - 1)).to_bytes(count, 'big')
@@ -0,0 +1,79 @@
+# Cache of decode results, addressed by the content of the module matrix
+#
+# The same symbol is often presented many times in a row (e.g. consecutive
+# camera frames): a repeated matrix gets its previous result back without
+# being decoded again. Failures are cached too, but only for a short time.
+
+import time
+from collections import OrderedDict
+from hashlib import blake2b
+
+KEY_DIGEST_SIZE = 16
+
+class DecodeCache:
+    """LRU cache of decode results (and of decode failures, for negative_ttl seconds)
+
+    Give it to QrCodeDecoder(..., cache=...), it can be shared by any number of decoders.
+    """
+
+    def __init__(self, max_size=256, negative_ttl=1.0, clock=time.monotonic):
+        if max_size < 1:
+            raise ValueError("The cache size has to be at least 1")
+
+        self.max_size = max_size
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        # key -> (DecodeResult, None, None) or (None, error, expiry time)
+        self.entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def key(size, packed, *options):
+        """Compute the key of a bit-packed module matrix (decoded with some options)"""
+        return (size, *options, blake2b(packed, digest_size=KEY_DIGEST_SIZE).digest())
+
+    def get_or_decode(self, key, decode):
+        """Return the cached result of key, or the result of decode() (which is cached)
+
+        The cached error is raised again if decode() failed recently.
+        The same result is returned to every hit: its lists (segments and
+        corrections) are turned into tuples, so that nobody can alter it.
+        """
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            result, error, expiry = entry
+            if error is None or self.clock() < expiry:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                if error is not None:
+                    raise error.with_traceback(None)
+                return result
+            del self.entries[key]
+
+        self.misses += 1
+        try:
+            result = decode()
+        except ValueError as e:
+            self._store(key, (None, e, self.clock() + self.negative_ttl))
+            raise
+
+        result = result._replace(segments=tuple(result.segments),
+                corrections=tuple(result.corrections))
+        self._store(key, (result, None, None))
+        return result
+
+    def _store(self, key, entry):
+        self.entries[key] = entry
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
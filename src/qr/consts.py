@@ -1,5 +1,7 @@
 from enum import IntEnum
-from ec import bch
+from functools import lru_cache
+
+from ec import bch, rs
 
 # 8.5 Error correction, Table 13-22 page 35-44
 EC_BLOCKS = [
@@ -326,6 +328,50 @@ VERSION_DIM = (6, 3)
 ALIGNMENT_PATTERN_VERSION_START = 2
 VERSION_BLOCK_VERSION_START = 7
 
+# 8.10 Version Information (Table D.1 page 68): BCH (18, 6) codewords
+VERSION_INFO = [None] * VERSION_BLOCK_VERSION_START + [
+    0x07C94, # Version 7
+    0x085BC, # Version 8
+    0x09A99, # Version 9
+    0x0A4D3, # Version 10
+    0x0BBF6, # Version 11
+    0x0C762, # Version 12
+    0x0D847, # Version 13
+    0x0E60D, # Version 14
+    0x0F928, # Version 15
+    0x10B78, # Version 16
+    0x1145D, # Version 17
+    0x12A17, # Version 18
+    0x13532, # Version 19
+    0x149A6, # Version 20
+    0x15683, # Version 21
+    0x168C9, # Version 22
+    0x177EC, # Version 23
+    0x18EC4, # Version 24
+    0x191E1, # Version 25
+    0x1AFAB, # Version 26
+    0x1B08E, # Version 27
+    0x1CC1A, # Version 28
+    0x1D33F, # Version 29
+    0x1ED75, # Version 30
+    0x1F250, # Version 31
+    0x209D5, # Version 32
+    0x216F0, # Version 33
+    0x228BA, # Version 34
+    0x2379F, # Version 35
+    0x24B0B, # Version 36
+    0x2542E, # Version 37
+    0x26A64, # Version 38
+    0x27541, # Version 39
+    0x28C69, # Version 40
+]
+VERSION_INFO_BIT_LEN = 18
+VERSION_INFO_DATA_BIT_LEN = 6
+VERSION_INFO_MAX_ERRORS = 3
+
+# Annex D: shortened BCH code, of generator x^12+x^11+x^10+x^9+x^8+x^5+x^2+1
+BCH_VERSION = bch.CyclicEncoder(VERSION_INFO_BIT_LEN, VERSION_INFO_DATA_BIT_LEN, 0b1111100100101)
+
 # 8.9 Format Information (Table 25)
 class FormatErrorCorrectionLevel(IntEnum):
     EC_LEVEL_L = 0b01 # 7%
@@ -351,9 +397,55 @@ FORMAT_DATA_EC_BIT_LEN = 2
 FORMAT_DATA_MP_BIT_LEN = 3
 FORMAT_DATA_MP_MASK = (1 << FORMAT_DATA_MP_BIT_LEN) - 1
 FORMAT_EC_BIT_LEN   = 10
+FORMAT_BIT_LEN = FORMAT_DATA_EC_BIT_LEN + FORMAT_DATA_MP_BIT_LEN + FORMAT_EC_BIT_LEN
 
 BCH_FORMAT = bch.BCH(4, 5, 3, 0)
 
+# Annex C (Table C.1): all the masked format codewords, indexed by their format data
+FORMAT_INFO = [
+    0b101010000010010, # 00 000
+    0b101000100100101, # 00 001
+    0b101111001111100, # 00 010
+    0b101101101001011, # 00 011
+    0b100010111111001, # 00 100
+    0b100000011001110, # 00 101
+    0b100111110010111, # 00 110
+    0b100101010100000, # 00 111
+    0b111011111000100, # 01 000
+    0b111001011110011, # 01 001
+    0b111110110101010, # 01 010
+    0b111100010011101, # 01 011
+    0b110011000101111, # 01 100
+    0b110001100011000, # 01 101
+    0b110110001000001, # 01 110
+    0b110100101110110, # 01 111
+    0b001011010001001, # 10 000
+    0b001001110111110, # 10 001
+    0b001110011100111, # 10 010
+    0b001100111010000, # 10 011
+    0b000011101100010, # 10 100
+    0b000001001010101, # 10 101
+    0b000110100001100, # 10 110
+    0b000100000111011, # 10 111
+    0b011010101011111, # 11 000
+    0b011000001101000, # 11 001
+    0b011111100110001, # 11 010
+    0b011101000000110, # 11 011
+    0b010010010110100, # 11 100
+    0b010000110000011, # 11 101
+    0b010111011011010, # 11 110
+    0b010101111101101, # 11 111
+]
+FORMAT_INFO_MAX_ERRORS = 3
+
+# 8.5.2 Generating the error correction codewords: RS codes over GF(2^8) (0x11D)
+RS_SYMBOL_BIT_LEN = 8
+
+@lru_cache(maxsize=None)
+def reed_solomon(nb_words, nb_data_words, capacity):
+    """Get the (shared) Reed-Solomon code of an EC_BLOCKS block configuration"""
+    return rs.ReedSolomon(RS_SYMBOL_BIT_LEN, nb_words, nb_data_words, capacity)
+
 ALPHANUM_CHARSET = [str(i) for i in range(10)] \
         + [chr(ord('A') + i) for i in range(26)] \
         + [' ', '$', '%', '*', '+', '-', '.', '/', ':']
@@ -372,6 +464,30 @@ NUM_TRIPLE_BIT_LEN = 10
 
 EIGHTBIT_BIT_LEN = 8
 
+# 8.4.5 Kanji Mode: 13-bit values of Shift JIS double bytes
+KANJI_BIT_LEN = 13
+KANJI_CHARSET = 'shift-jis'
+KANJI_ROW_LEN = 0xC0
+KANJI_SPLIT = 0x1F00 # Double bytes 0x8140-0x9FFC are below, 0xE040-0xEBBF above
+KANJI_OFFSETS = (0x8140, 0xC140)
+
+# Structured Append header (after its mode indicator): symbol position, total - 1, parity
+STRUCTURED_APPEND_INDEX_BIT_LEN = 4
+STRUCTURED_APPEND_TOTAL_BIT_LEN = 4
+STRUCTURED_APPEND_PARITY_BIT_LEN = 8
+STRUCTURED_APPEND_MAX_SYMBOLS = 1 << STRUCTURED_APPEND_TOTAL_BIT_LEN
+
+@lru_cache(maxsize=None)
+def kanji_table():
+    """Get the Shift JIS double byte of each 13-bit Kanji mode value (built on first use)"""
+
+    table = []
+    for value in range(1 << KANJI_BIT_LEN):
+        double_byte = (value // KANJI_ROW_LEN) << 8 | (value % KANJI_ROW_LEN)
+        double_byte += KANJI_OFFSETS[double_byte >= KANJI_SPLIT]
+        table.append(double_byte.to_bytes(2, 'big'))
+    return tuple(table)
+
 class Eci:
     # Those ECIs are in the category:
     # Encodable -> Interpretative -> Character Set ECIs (0-899)
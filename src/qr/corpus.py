@@ -0,0 +1,150 @@
+# Binary container for large collections of QR Code matrices
+#
+# File layout (all integers are little-endian):
+# - Header: magic, format version, number of matrices, offset of the index
+# - Matrices: bit-packed matrices (see engines.load_packed), one after the other
+# - Index: for each matrix, its offset, size and version (0 if the size isn't a valid one)
+#
+# The reader memory-maps the file: accessing a matrix by its index is O(1),
+# and the matrices are handed over to QrCodeDecoder as zero-copy views.
+
+import mmap
+import struct
+from collections import namedtuple
+from pathlib import Path
+
+from qr import consts, engines
+from qr.decoder import QrCodeDecoder
+
+MAGIC = b'QRCORPUS'
+FORMAT_VERSION = 1
+
+# Magic, format version, reserved, number of matrices, index offset
+HEADER = struct.Struct('<8sHHIQ')
+# Matrix offset, size, version, reserved
+INDEX_ENTRY = struct.Struct('<QHB5x')
+
+CorpusEntry = namedtuple('CorpusEntry', ['size', 'version', 'data'])
+
+def _size_version(size):
+    version, rest = divmod(size - 17, 4)
+    if rest or version not in range(1, len(consts.EC_BLOCKS)):
+        return 0
+    return version
+
+class CorpusWriter:
+    """Write QR Code matrices to a corpus file"""
+
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.index = []
+
+        # The header is written for real when closing, once the index is known
+        self.file.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, 0, 0))
+
+    def add(self, qr_code, size=None):
+        """Append a matrix (in any form accepted by engines.load_packed), return its index"""
+
+        size, packed = engines.load_packed(qr_code, size)
+        self.index.append(INDEX_ENTRY.pack(self.file.tell(), size, _size_version(size)))
+        self.file.write(packed)
+        return len(self.index) - 1
+
+    def close(self):
+        if self.file.closed:
+            return
+
+        index_offset = self.file.tell()
+        self.file.write(b''.join(self.index))
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(self.index), index_offset))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class CorpusReader:
+    """Memory-mapped reader of a corpus file
+
+    The entries data are views into the file mapping. They (and the decoders
+    reading them) stay valid after closing the reader: the file is then
+    unmapped once the last of them is gone.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mmap)
+
+        if len(self.mmap) < HEADER.size:
+            self.close()
+            raise ValueError("Not a QR Code corpus file")
+
+        magic, format_version, _, self.count, self.index_offset = HEADER.unpack_from(self.mmap)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("Not a QR Code corpus file")
+        if format_version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"Unsupported QR Code corpus format version {format_version}")
+        if self.index_offset + self.count * INDEX_ENTRY.size > len(self.mmap):
+            self.close()
+            raise ValueError("Truncated QR Code corpus file")
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += self.count
+        if idx not in range(self.count):
+            raise IndexError("Corpus index out of range")
+
+        offset, size, version = INDEX_ENTRY.unpack_from(self.mmap,
+                self.index_offset + idx * INDEX_ENTRY.size)
+        end = offset + size * engines.packed_stride(size)
+        return CorpusEntry(size, version, self.view[offset:end])
+
+    def __iter__(self):
+        for idx in range(self.count):
+            yield self[idx]
+
+    def decoder(self, idx, engine=None):
+        """Get a decoder of a matrix, reading straight from the file mapping"""
+
+        entry = self[idx]
+        return QrCodeDecoder(entry.data, engine, entry.size)
+
+    def close(self):
+        if self.mmap is None:
+            return
+
+        self.view.release()
+        try:
+            self.mmap.close()
+        except BufferError:
+            # Entries data are still alive: the mapping is closed along with
+            # the mmap object, when the last of them is garbage collected
+            pass
+        self.view, self.mmap = (None, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def convert_directory(directory, path, pattern='*.qr'):
+    """Convert a directory of ASCII '0'/'1' matrix files into a corpus file
+
+    The files are stored in the order of their sorted names, which is returned.
+    """
+
+    filenames = sorted(Path(directory).glob(pattern))
+    with CorpusWriter(path) as writer:
+        for filename in filenames:
+            writer.add(str(filename))
+    return filenames
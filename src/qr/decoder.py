@@ -1,127 +1,243 @@
-from io import StringIO, BytesIO
-
-from qr import consts
-from ec.bch import BchDecodingFailure
+import codecs
+import logging
+import pickle
+from collections import namedtuple
+from fractions import Fraction
+from functools import partial
+from io import BytesIO
+from multiprocessing import Pool
+from time import perf_counter_ns
+
+from qr import consts, engines, layout
+from qr.bitstream import BitReader
+from ec.rs import ReedSolomonDecodingFailure
+
+_LOGGER = logging.getLogger(__name__)
+
+# A data segment of a QR Code
+# - mode: its DataModeIndicator
+# - char_count: its number of characters
+# - bit_offset: position of its mode indicator in the data bitstream
+# - eci: ECI designator of the character set in use
+# - data: its decoded raw bytes
+# - text: its decoded text (a character split over several segments comes with the last one)
+Segment = namedtuple('Segment', ['mode', 'char_count', 'bit_offset', 'eci', 'data', 'text'])
+
+# Structured Append header of a symbol holding a part of a message
+# - index: position of the symbol in the sequence (from 0)
+# - total: number of symbols of the sequence
+# - parity: XOR of all the bytes of the whole message data
+StructuredAppend = namedtuple('StructuredAppend', ['index', 'total', 'parity'])
+
+# Result of the decoding of a QR Code
+# - text: decoded message
+# - data: concatenated raw bytes of all the segments
+# - segments: list of Segment
+# - version, ec_level, mask_pattern: symbol characteristics (ec_level indexes consts.EC_LEVEL)
+# - corrections: number of corrected codewords of each block
+# - version_info: version read from the version information blocks (None below version 7)
+# - structured_append: StructuredAppend header (None if the symbol holds a whole message)
+DecodeResult = namedtuple('DecodeResult',
+        ['text', 'data', 'segments', 'version', 'ec_level', 'mask_pattern', 'corrections',
+         'version_info', 'structured_append'])
+
+# Metadata of a QR Code, as read by QrCodeDecoder.probe()
+# - formats_agree: whether both format copies were readable (and agreed on the format)
+# - version_info: version read from the version information blocks (None below version 7)
+SymbolInfo = namedtuple('SymbolInfo',
+        ['version', 'ec_level', 'mask_pattern', 'formats_agree', 'version_info'])
+
+# Outcome of the decoding of one item of a batch: either result or error is None
+BatchResult = namedtuple('BatchResult', ['index', 'result', 'error'])
 
 class QrCodeDecoder:
-    """QR Code Decoder"""
-
-
-    def __init__(self, qr):
-        self.version = 0
-        self.ec_level, self.mask_pattern = (None, None)
-        self.fp_mask = None
-        self.blocks = None
+    """QR Code Decoder
 
-        self.size, self.matrix = self._load(qr)
+    The QR Code matrix can be given in any of the forms accepted by
+    engines.load_packed (size is needed for bit-packed bytes-like inputs).
 
-    @staticmethod
-    def _load(qr_code):
-        if isinstance(qr_code, str):
-            load_from_file = True
-            with open(qr_code, 'r', encoding="ascii") as file:
-                rows = file.readlines()
-        else:
-            load_from_file = False
-            rows = qr_code
+    With recover_format, a symbol whose both format copies are unrecoverable
+    is still decoded: its format is found by trying all of them (see _recover_format).
 
-        height = len(rows)
-        matrix = [[0] * height for _ in range(height)]
+    With a cache (cache.DecodeCache), decode() returns the result of an already
+    decoded identical matrix right away: the attributes describing the
+    decoding (version, blocks...) are then left unset.
 
-        for row_idx, row in enumerate(rows):
-            if load_from_file:
-                row = row.strip()
+    An observer (see profiling.DecodeObserver) receives the start and end
+    events of each decoding stage, with their counters.
+    """
 
-            if len(row) != height:
-                raise ValueError("QR Matrix needs to be a square")
 
-            for col_idx, module in enumerate(row):
-                module_int = int(module)
-                if module_int not in [0, 1]:
-                    raise ValueError("QR module values should be 0 or 1")
-                matrix[row_idx][col_idx] = module_int
+    def __init__(self, qr, engine=None, size=None, recover_format=False, cache=None,
+            observer=None):
+        self.engine = engines.get_engine(engine)
+        self.recover_format = recover_format
+        self.cache = cache
+        self.observer = observer
+        self.version = 0
+        self.version_info = None
+        self.ec_level, self.mask_pattern = (None, None)
+        self.layout = None
+        self.blocks = None
+        self.corrections = None
+        self.structured_append = None
 
-        return height, matrix
+        self.size, self.matrix = self._run_stage('load', self.engine.load, qr, size)
 
     def decode(self):
-        self.version = self._get_version()
-
-        alignment_patterns = self._compute_alignment_patterns()
-        self.fp_mask = self._compute_function_patterns_mask(alignment_patterns)
+        if self.cache is None:
+            return self._decode()
+
+        key = self.cache.key(self.size, self.engine.pack(self.matrix), self.recover_format)
+        return self.cache.get_or_decode(key, self._decode)
+
+    def _decode(self):
+        segments = list(self.iter_segments())
+        text = ''.join(segment.text for segment in segments)
+        data = b''.join(segment.data for segment in segments)
+
+        return DecodeResult(text, data, segments,
+                self.version, self.ec_level, self.mask_pattern, self.corrections,
+                self.version_info, self.structured_append)
+
+    def iter_segments(self):
+        """Decode the QR Code, yielding each Segment as soon as it is parsed
+
+        Stopping the iteration skips the parsing of the remaining segments.
+        """
+
+        self._run_stage('format', self.probe)
+
+        self.layout = layout.get_layout(self.version)
+
+        codewords = self._run_stage('unfold', self._unfold_codewords)
+        codewords = self._run_stage('unmask', self._unmask, codewords)
+        self.blocks = self._run_stage('deinterlace', self._deinterlace_blocks, codewords)
+        self.corrections = self._run_stage('correct', self._correct_blocks)
+
+        bitstream = BitReader(b''.join(block[0] for block in self.blocks))
+        self.structured_append = self._parse_structured_append(bitstream)
+        segments = self._decode_data_blocks_segments(bitstream, self.version)
+        if self.observer is not None:
+            segments = self._observe_segments(segments)
+        yield from segments
+
+    def _run_stage(self, stage, function, *args):
+        observer = self.observer
+        if observer is None:
+            return function(*args)
+
+        observer.stage_start(stage, perf_counter_ns())
+        result = function(*args)
+        observer.stage_end(stage, perf_counter_ns(), self._stage_counters(stage, result))
+        return result
+
+    def _stage_counters(self, stage, result):
+        if stage == 'load':
+            size, _ = result
+            return {'modules': size * size}
+        if stage == 'format':
+            nb_modules = 2 * consts.FORMAT_BIT_LEN
+            if self.version_info is not None:
+                nb_modules += 2 * consts.VERSION_INFO_BIT_LEN
+            return {'modules': nb_modules}
+        if stage == 'unfold':
+            return {'modules': 8 * self.layout.nb_codewords}
+        if stage == 'unmask':
+            return {'codewords': self.layout.nb_codewords}
+        if stage == 'deinterlace':
+            return {'blocks': len(result)}
+        if stage == 'correct':
+            return {'errors_corrected': sum(result)}
+        return {}
+
+    def _observe_segments(self, segments):
+        """Wrap the segment parsing into a 'parse' stage
+
+        The stage also ends when the iteration is stopped early.
+        """
+
+        counters = {'segments': 0, 'bytes': 0}
+        self.observer.stage_start('parse', perf_counter_ns())
+        try:
+            for segment in segments:
+                counters['segments'] += 1
+                counters['bytes'] += len(segment.data)
+                yield segment
+        except GeneratorExit:
+            self.observer.stage_end('parse', perf_counter_ns(), counters)
+            raise
+        self.observer.stage_end('parse', perf_counter_ns(), counters)
+
+    def probe(self):
+        """Read the symbol metadata only, without decoding the data
+
+        Only the format (and version information) modules are read: this is
+        much cheaper than decode().
+        """
 
-        self.ec_level, self.mask_pattern = self._decode_format()
-        self._unmask()
-        self.blocks = self._deinterlace_blocks()
-        return self._decode_data_blocks_segments()
+        self.version = self._get_version()
+        self.version_info = self._decode_version_info()
+        try:
+            self.ec_level, self.mask_pattern, formats_agree = self._decode_format()
+        except ValueError:
+            if not self.recover_format:
+                raise
+            self.ec_level, self.mask_pattern = self._recover_format()
+            formats_agree = False
+
+        return SymbolInfo(self.version, self.ec_level, self.mask_pattern, formats_agree,
+                self.version_info)
 
     def _get_version(self):
         version = (self.size - 21) / 4 + 1
 
-        if not version.is_integer():
+        if not version.is_integer() or version not in range(1, len(consts.EC_BLOCKS)):
             raise ValueError("Invalid QR code matrix size")
 
         return int(version)
 
-    def _compute_alignment_patterns(self):
-        ap_db = consts.ALIGNMENT_PATTERNS[self.version]
-        my_ap = [None] * (len(ap_db) ** 2 - 3)
-        i = 0
-        for coord1 in ap_db:
-            for coord2 in ap_db:
-                # No alignment pattern at (6, 6) because of NW finder pattern
-                if coord1 == ap_db[0] and coord2 == ap_db[0]:
-                    continue
-
-                # No alignment pattern at (6, z) and (z, 6) (z = ap_db[-1])
-                # Because of NE and SW finder patterns
-                if {coord1, coord2} == {ap_db[0], ap_db[-1]}:
-                    continue
-
-                my_ap[i] = (coord1, coord2)
-                i = i+1
-        return my_ap
-
-    def _compute_function_patterns_mask(self, alignment_patterns):
-        fp_mask = [[0] * self.size for _ in range(self.size)]
-
-        # Finder Patterns and Spacers
-        # Formats
-        # The Dark Module
-        for i in range(consts.FINDER_PATTERN_SIZE + 1):
-            for j in range(consts.FINDER_PATTERN_SIZE):
-                j_mirror = -consts.FINDER_PATTERN_SIZE + j
-
-                fp_mask[i][j] = 1
-                fp_mask[i][j_mirror] = 1
-                fp_mask[j_mirror][i] = 1
-
-            fp_mask[i][consts.FINDER_PATTERN_SIZE] = 1
-
-        # Timing Patterns
-        for i in range(consts.FINDER_PATTERN_SIZE, self.size - consts.FINDER_PATTERN_SIZE):
-            fp_mask[consts.TIMING_PATTERN_ROW_COL][i] = 1
-            fp_mask[i][consts.TIMING_PATTERN_ROW_COL] = 1
-
-        if self.version < consts.ALIGNMENT_PATTERN_VERSION_START:
-            return fp_mask
-
-        # Alignment Patterns
-        for ap_center_row, ap_center_col in alignment_patterns:
-            for i in range(ap_center_row - 2, ap_center_row + 3, 1):
-                for j in range(ap_center_col - 2, ap_center_col + 3, 1):
-                    fp_mask[i][j] = 1
+    def _module(self, row, col):
+        return self.engine.module(self.matrix, row, col)
+
+    def _unfold_version_infos(self):
+        ne_version_info = 0
+        sw_version_info = 0
+
+        # Both blocks are 6x3 and transposed of each other, LSb is the nearest to the corner
+        offset = self.size - consts.FINDER_PATTERN_SIZE - consts.VERSION_DIM[1]
+        for i in range(consts.VERSION_INFO_BIT_LEN - 1, -1, -1):
+            major, minor = divmod(i, consts.VERSION_DIM[1])
+            ne_version_info = (ne_version_info << 1) | self._module(major, offset + minor)
+            sw_version_info = (sw_version_info << 1) | self._module(offset + minor, major)
+
+        return [ne_version_info, sw_version_info]
 
+    @staticmethod
+    def _lookup_version_info(version_info_raw):
+        # With only 34 valid codewords, finding the nearest one is cheaper than BCH decoding
+        distance, version = min((bin(version_info_raw ^ codeword).count('1'), version) \
+                for version, codeword in enumerate(consts.VERSION_INFO) if codeword is not None)
+
+        if distance > consts.VERSION_INFO_MAX_ERRORS:
+            return None
+        return version
+
+    def _decode_version_info(self):
         if self.version < consts.VERSION_BLOCK_VERSION_START:
-            return fp_mask
+            return None
+
+        versions = [self._lookup_version_info(version_info_raw) \
+                for version_info_raw in self._unfold_version_infos()]
 
-        # Versions
-        for i in range(consts.VERSION_DIM[0]):
-            for j in range(consts.VERSION_DIM[1]):
-                j_mirror = -consts.FINDER_PATTERN_SIZE - consts.VERSION_DIM[1] + j
-                fp_mask[j_mirror][i] = 1
-                fp_mask[i][j_mirror] = 1
+        if versions == [None, None]:
+            raise ValueError("Both version information blocks have non-recoverable errors")
 
-        return fp_mask
+        # The size has to be confirmed by at least one of the blocks
+        if self.version not in versions:
+            raise ValueError("Version information doesn't match the matrix size")
+
+        return self.version
 
     def _unfold_formats(self):
         nw_format = 0
@@ -131,144 +247,240 @@ class QrCodeDecoder:
         for i in range(consts.FINDER_PATTERN_SIZE):
             # Skip Vertical Timing Pattern for NW format
             if i != consts.TIMING_PATTERN_ROW_COL:
-                nw_format = (nw_format << 1) | self.matrix[consts.FINDER_PATTERN_SIZE][i]
+                nw_format = (nw_format << 1) | self._module(consts.FINDER_PATTERN_SIZE, i)
             # Skip The Dark Module for SWNE format
             if i != consts.FINDER_PATTERN_SIZE - 1:
-                swne_format = (swne_format << 1) | self.matrix[-1 - i][consts.FINDER_PATTERN_SIZE]
+                swne_format = (swne_format << 1) | self._module(-1 - i, consts.FINDER_PATTERN_SIZE)
 
         # Read vertical part of NW format and horizontal part of SWNE format
         for i in range(consts.FINDER_PATTERN_SIZE, -1, -1):
             # Skip Horizontal Timing Pattern for NW format
             if i != consts.TIMING_PATTERN_ROW_COL:
-                nw_format = (nw_format << 1) | self.matrix[i][consts.FINDER_PATTERN_SIZE]
+                nw_format = (nw_format << 1) | self._module(i, consts.FINDER_PATTERN_SIZE)
             # Skip out of bounds module for SWNE format
             if i > 0:
-                swne_format = (swne_format << 1) | self.matrix[consts.FINDER_PATTERN_SIZE][-i]
+                swne_format = (swne_format << 1) | self._module(consts.FINDER_PATTERN_SIZE, -i)
 
         return [nw_format, swne_format]
 
     def _decode_format(self):
-        formats = self._unfold_formats()
-        valid_formats = []
+        nw_format, swne_format = self._unfold_formats()
+
+        # A format codeword is a candidate if at least one copy is within its correction capacity
+        # Both copies are decoded jointly: the candidate nearest to the pair of copies is chosen
+        # (the NW copy breaks the ties)
+        max_errors = consts.FORMAT_INFO_MAX_ERRORS
+        candidates = []
+        for format_data, codeword in enumerate(consts.FORMAT_INFO):
+            nw_distance = bin(nw_format ^ codeword).count('1')
+            swne_distance = bin(swne_format ^ codeword).count('1')
+            if min(nw_distance, swne_distance) <= max_errors:
+                candidates.append((nw_distance + swne_distance, nw_distance, swne_distance,
+                    format_data))
+
+        if not candidates:
+            raise ValueError("Both formats have non-recoverable errors")
+
+        _, nw_distance, swne_distance, format_data = min(candidates)
+
+        # Extract EC Level and Mask Pattern from the format data
+        ec_level = format_data >> consts.FORMAT_DATA_MP_BIT_LEN
+        mask_pattern = format_data & consts.FORMAT_DATA_MP_MASK
+        formats_agree = nw_distance <= max_errors and swne_distance <= max_errors
+        return ec_level, mask_pattern, formats_agree
+
+    def _recover_format(self):
+        """Find the format of a symbol whose format copies are both unrecoverable
+
+        Each of the 32 (EC level, mask pattern) candidates is valid if all its
+        blocks can be corrected by their Reed-Solomon codes. Among the valid ones,
+        the candidate using the lowest share of its correction capacity (errors
+        over capacity, for all the blocks) is taken. Codes of a lower EC level only
+        check a subset of the syndromes of the higher ones: on a tie, the candidate
+        checking the most syndromes wins, then the nearest to the format copies.
+
+        The candidates (the nearest to the format copies first) are screened on
+        the first block of each block group: only the ones within the correction
+        capacity there, and within the share of the capacity the best valid
+        candidate so far uses, are fully checked.
+        """
+
+        nw_format, swne_format = self._unfold_formats()
+        candidates = sorted(range(len(consts.FORMAT_INFO)), key=lambda format_data: \
+                bin(nw_format ^ consts.FORMAT_INFO[format_data]).count('1') \
+                + bin(swne_format ^ consts.FORMAT_INFO[format_data]).count('1'))
+
+        # The (masked) data modules are gathered once for all the candidates,
+        # and unmasked once per mask pattern
+        version_layout = layout.get_layout(self.version)
+        masked_codewords = self.engine.gather_codewords(self.matrix, version_layout)
+        unmasked = {}
+
+        best_score, best_format = None, None
+        for format_data in candidates:
+            ec_level = format_data >> consts.FORMAT_DATA_MP_BIT_LEN
+            mask_pattern = format_data & consts.FORMAT_DATA_MP_MASK
+
+            if mask_pattern not in unmasked:
+                codewords = self.engine.unmask_codewords(masked_codewords, version_layout,
+                        mask_pattern)
+                unmasked[mask_pattern] = (codewords, bytes(codewords))
 
-        for format_raw in formats:
-            format_ = format_raw ^ consts.FORMAT_MASK_PATTERN
+            # To beat the best candidate, the errors must fit in the same share of the capacity
+            max_errors = None
+            if best_score is not None:
+                capacity = sum(nb_blocks * consts.reed_solomon(*block_config).t \
+                        for nb_blocks, block_config in consts.EC_BLOCKS[self.version][ec_level])
+                max_errors = int(best_score[0] * capacity)
 
-            try:
-                _, format_ = consts.BCH_FORMAT.decode(format_)
-            except BchDecodingFailure:
+            if self._screen_blocks(unmasked[mask_pattern][1], version_layout, ec_level,
+                    max_errors) is None:
                 continue
 
-            # Get format data by getting rid of the error correction bits
-            format_data = format_ >> consts.FORMAT_EC_BIT_LEN
+            blocks = self.engine.deinterlace_blocks(unmasked[mask_pattern][0], version_layout,
+                    ec_level)
+            score = self._score_blocks(blocks, self.version, ec_level, max_errors)
 
-            # Extract EC Level and Mask Pattern from the format data
-            ec_level = format_data >> consts.FORMAT_DATA_MP_BIT_LEN
-            mask_pattern = format_data & consts.FORMAT_DATA_MP_MASK
-            valid_formats.append((format_, ec_level, mask_pattern))
+            # The candidates are sorted: the nearest stays the best on a tie
+            if score is not None and (best_score is None or score < best_score):
+                best_score, best_format = score, (ec_level, mask_pattern)
 
-        if not valid_formats:
+        if best_score is None:
             raise ValueError("Both formats have non-recoverable errors")
 
-        if len(valid_formats) == 2 and valid_formats[0][0] != valid_formats[1][0]:
-            raise ValueError("Formats disagree")
-
-        # Authoritative format is first correct one found (NW, or SWNE if NW was unrecoverable)
-        _, ec_level, mask_pattern = valid_formats[0]
-        return ec_level, mask_pattern
-
-    def _unmask(self):
-        for row in range(self.size):
-            for col in range(self.size):
-                if self.fp_mask[row][col]:
-                    continue
-                self.matrix[row][col] ^= consts.FORMAT_MASK_PATTERNS[self.mask_pattern](row, col)
-
-    def _unfold_modules_stream(self):
-        go_up = True
-        bit = 7
-        byte = 0
-
-        # Outer loop: for each "column couple"
-        for column_right in range(self.size - 1, 0, -2):
-            # Skip Vertical Timing Pattern
-            if column_right <= consts.TIMING_PATTERN_ROW_COL:
-                column_right = column_right - 1
-
-            # Configure middle loop range depending on whether we are going up or down
-            row_start = self.size - 1 if go_up else 0
-            row_end = -1 if go_up else self.size
-            row_dir = -1 if go_up else 1
-
-            # Middle loop: Row up up up, or row down down down
-            for row in range(row_start, row_end, row_dir):
-
-                # Inner loop: Column right left
-                for i in range(2):
-                    col = column_right - i
-
-                    # Skip Function Patterns
-                    if self.fp_mask[row][col]:
-                        continue
-
-                    byte |= (self.matrix[row][col] << bit)
-                    bit -= 1
-                    if bit == -1:
-                        yield byte
-                        byte = 0
-                        bit = 7
-
-            # We've reached symbol bounds, let's reverse the middle loop direction
-            go_up = not go_up
-
-    def _deinterlace_blocks(self):
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug("Recovered format: %s (%.0f%% of the correction capacity used)",
+                    best_format, 100 * best_score[0])
+
+        return best_format
+
+    @staticmethod
+    def _block_errors(rs_code, words, max_errors=None):
+        """Estimate the number of errors of a block from its syndromes
+
+        Return the degree of the error locator polynomial and the number of
+        syndromes. When there are more than max_errors, the estimation may stop
+        early (on the first 2 * (max_errors + 1) syndromes), with a lower bound.
+        """
+
+        nb_syndromes = rs_code.length - rs_code.k
+        if max_errors is not None and 2 * (max_errors + 1) < nb_syndromes:
+            # The length of the LFSR of the first syndromes is a lower bound
+            poly = list(reversed(words))
+            syndromes = [rs_code.gf.gf_poly_eval(poly, rs_code.gf.gf_exp(j)) \
+                    for j in range(2 * (max_errors + 1))]
+            if any(syndromes):
+                error_locator_poly = rs_code.berlekamp_massey(syndromes)
+                while not error_locator_poly[-1]:
+                    error_locator_poly.pop()
+                if len(error_locator_poly) - 1 > max_errors:
+                    return len(error_locator_poly) - 1, nb_syndromes
+
+        syndromes = rs_code.syndromes(words)
+        if not any(syndromes):
+            return 0, nb_syndromes
+
+        error_locator_poly = rs_code.berlekamp_massey(syndromes)
+        while not error_locator_poly[-1]:
+            error_locator_poly.pop()
+        return len(error_locator_poly) - 1, nb_syndromes
+
+    @classmethod
+    def _screen_blocks(cls, codewords, version_layout, ec_level, max_errors=None):
+        """Count the errors of the first block of each block group
+
+        The count is a lower bound of the one of all the blocks. Return None as
+        soon as a block is beyond its correction capacity, or there are more
+        than max_errors.
+        """
+
+        nb_errors = 0
+        block_idx = 0
+        blocks = version_layout.blocks[ec_level]
+        for nb_blocks, block_config in consts.EC_BLOCKS[version_layout.version][ec_level]:
+            rs_code = consts.reed_solomon(*block_config)
+            bound = rs_code.t if max_errors is None else min(rs_code.t, max_errors - nb_errors)
+
+            data_idx, error_idx = blocks[block_idx]
+            words = [codewords[idx] for idx in data_idx] + [codewords[idx] for idx in error_idx]
+            block_errors, _ = cls._block_errors(rs_code, words, bound)
+            if block_errors > bound:
+                return None
+
+            nb_errors += block_errors
+            block_idx += nb_blocks
+        return nb_errors
+
+    @staticmethod
+    def _score_blocks(blocks, version, ec_level, max_errors=None):
+        """Score the blocks by the share of their correction capacity their errors use
+
+        Return None if a block can't be corrected, or there are more than max_errors.
+        Otherwise, return the number of errors over the total capacity, and the
+        opposite of the number of syndromes.
+        """
+
+        nb_errors = 0
+        capacity = 0
+        nb_syndromes = 0
+        blocks = iter(blocks)
+        for nb_blocks, block_config in consts.EC_BLOCKS[version][ec_level]:
+            rs_code = consts.reed_solomon(*block_config)
+
+            for _ in range(nb_blocks):
+                data_words, error_words = next(blocks)
+                try:
+                    block_errors, _ = rs_code.decode(data_words + error_words)
+                except ReedSolomonDecodingFailure:
+                    return None
+
+                nb_errors += block_errors
+                if max_errors is not None and nb_errors > max_errors:
+                    return None
+                capacity += rs_code.t
+                nb_syndromes += rs_code.length - rs_code.k
+
+        return Fraction(nb_errors, capacity), -nb_syndromes
+
+    def _unfold_codewords(self):
+        return self.engine.gather_codewords(self.matrix, self.layout)
+
+    def _unmask(self, codewords):
+        return self.engine.unmask_codewords(codewords, self.layout, self.mask_pattern)
+
+    def _deinterlace_blocks(self, codewords):
+        return self.engine.deinterlace_blocks(codewords, self.layout, self.ec_level)
+
+    def _correct_blocks(self):
         ec_config = consts.EC_BLOCKS[self.version][self.ec_level]
 
-        word_generator = self._unfold_modules_stream()
+        # Number of corrected codewords, for each block
+        corrections = []
+
+        blocks = iter(self.blocks)
+        for nb_blocks, (nb_words, nb_data_words, capacity) in ec_config:
+            rs_code = consts.reed_solomon(nb_words, nb_data_words, capacity)
 
-        # Allocate data and error bytearrays for each block
-        blocks = []
-        _, (max_nb_words, max_nb_data_words, _) = ec_config[-1] # Last blocks have max word number
-        max_words_per_block = [max_nb_data_words, max_nb_words - max_nb_data_words]
-        for nb_blocks, (nb_words, nb_data_words, _) in ec_config:
-            nb_error_words = nb_words - nb_data_words
             for _ in range(nb_blocks):
-                blocks.append([bytearray(nb_data_words), bytearray(nb_error_words)])
-
-        # Fill each byte of each data and error bytearray of each block
-        # Do this in a de-interlacing manner so that following bytes:
-        # B0D0 B1D0 B2D0 B0D1 B1D1 B2D1 B0E0 B1E0 B2E0 B0E1 B1E1 B2E1
-        # get stored with following layout:
-        # B0D0 B0D1 B0E0 B0E1 B1D0 B1D1 B1E0 B1E1 B2D0 B2D1 B2E0 B2D1
-
-        # All data words first, then all error words
-        for is_error_word in range(2):
-            # For each word
-            for word_idx in range(max_words_per_block[is_error_word]):
-                block_idx = 0
-                # For each block group
-                for nb_blocks, (nb_words, nb_data_words, _) in ec_config:
-                    nb_words = [nb_data_words, nb_words - nb_data_words]
-
-                    # When some blocks are shorter than others, we need to skip
-                    # non-existing words for those blocks
-                    if word_idx == nb_words[is_error_word]:
-                        block_idx += nb_blocks
-                        continue
-
-                    # For each block of that block group, get the next byte in the QR code matrix
-                    for _ in range(nb_blocks):
-                        blocks[block_idx][is_error_word][word_idx] = next(word_generator)
-                        block_idx += 1
-
-        return blocks
+                block = next(blocks)
+                try:
+                    nb_errors, codeword = rs_code.decode(block[0] + block[1])
+                except ReedSolomonDecodingFailure as e:
+                    raise ValueError(f"Block {len(corrections)} has non-recoverable errors") from e
+
+                if nb_errors:
+                    block[0][:] = codeword[:nb_data_words]
+                    block[1][:] = codeword[nb_data_words:]
+                corrections.append(nb_errors)
+
+        return corrections
 
     @staticmethod
     def _parse_eci_designator(bitstream):
         # The ECI Designator can be over 1, 2 or 3 bytes
         # To find out, we first fetch a first byte, and analyse its 3 MSb
         # The number of leading ones in its 3 MSb is the nb of additional bytes
-        eci_designator = int(bitstream.read(consts.Eci.DESIGNATOR_WORD_LEN), 2)
+        eci_designator = bitstream.read_bits(consts.Eci.DESIGNATOR_WORD_LEN)
         eci_designator_preamble = eci_designator >> 5
 
         # Find out the number of leading ones in the 3 bits preamble
@@ -287,7 +499,7 @@ class QrCodeDecoder:
             eci_designator &= 0x7f >> additional
             # Fetch the additional bytes
             eci_designator <<= fetch_bit_len
-            eci_designator |= int(bitstream.read(fetch_bit_len), 2)
+            eci_designator |= bitstream.read_bits(fetch_bit_len)
 
         if eci_designator not in range(*consts.Eci.CHARSET_RANGE):
             raise ValueError("Only Character Set Interpretative Encodable ECIs are supported")
@@ -295,73 +507,102 @@ class QrCodeDecoder:
         if eci_designator not in consts.Eci.CHARSETS:
             raise ValueError("Unsupported ECI Charset")
 
-        print(f"ECI Charset: {eci_designator} ({consts.Eci.CHARSETS[eci_designator]})")
         return eci_designator
 
-    def _decode_data_blocks_segments(self):
-        bitstream = StringIO()
-        for block in self.blocks:
-            for byte in block[0]:
-                bitstream.write(format(byte, '08b'))
+    @staticmethod
+    def _parse_structured_append(bitstream):
+        """Parse the Structured Append header at the start of the bitstream, if any"""
+
+        header_bit_len = consts.DATA_MODE_INDICATOR_BIT_LEN \
+                + consts.STRUCTURED_APPEND_INDEX_BIT_LEN + consts.STRUCTURED_APPEND_TOTAL_BIT_LEN \
+                + consts.STRUCTURED_APPEND_PARITY_BIT_LEN
+        if bitstream.remaining() < header_bit_len:
+            return None
 
-        bitstream.seek(0)
-        data_buf = StringIO()
-        charset = consts.Eci.CHARSETS[consts.Eci.DEFAULT_CHARSET]
-        eci_segment = BytesIO()
+        if bitstream.peek_bits(consts.DATA_MODE_INDICATOR_BIT_LEN) \
+                != consts.DataModeIndicator.STRUCTURED_APPEND:
+            return None
+
+        bitstream.read_bits(consts.DATA_MODE_INDICATOR_BIT_LEN)
+        index = bitstream.read_bits(consts.STRUCTURED_APPEND_INDEX_BIT_LEN)
+        total = bitstream.read_bits(consts.STRUCTURED_APPEND_TOTAL_BIT_LEN) + 1
+        parity = bitstream.read_bits(consts.STRUCTURED_APPEND_PARITY_BIT_LEN)
+
+        if index >= total:
+            raise ValueError("Structured Append symbol position out of its sequence")
+
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug("Structured Append: symbol %d of %d (parity 0x%02x)",
+                    index + 1, total, parity)
+
+        return StructuredAppend(index, total, parity)
+
+    @staticmethod
+    def _decode_data_blocks_segments(bitstream, version):
+        debug = _LOGGER.isEnabledFor(logging.DEBUG)
+
+        segment_decoders = {
+            consts.DataModeIndicator.NUMERIC: QrCodeDecoder._decode_numeric_segment,
+            consts.DataModeIndicator.ALPHANUMERIC: QrCodeDecoder._decode_alphanumeric_segment,
+            consts.DataModeIndicator.EIGHTBITBYTE: QrCodeDecoder._decode_eightbitbyte_segment,
+            consts.DataModeIndicator.KANJI: QrCodeDecoder._decode_kanji_segment,
+        }
+
+        eci = consts.Eci.DEFAULT_CHARSET
+        text_decoder = codecs.getincrementaldecoder(consts.Eci.CHARSETS[eci])()
         while True:
-            try:
-                mode = int(bitstream.read(consts.DATA_MODE_INDICATOR_BIT_LEN), 2)
-            except ValueError:
-                print("Bitstream exhaustion (terminator implied)")
+            # The terminator can be truncated (or omitted) at the end of the symbol
+            if bitstream.remaining() < consts.DATA_MODE_INDICATOR_BIT_LEN:
+                if debug:
+                    _LOGGER.debug("Bitstream exhaustion (terminator implied)")
                 break
 
+            bit_offset = bitstream.pos
+            mode = bitstream.read_bits(consts.DATA_MODE_INDICATOR_BIT_LEN)
+
             if mode == consts.DataModeIndicator.TERMINATOR:
-                print("Terminator")
+                if debug:
+                    _LOGGER.debug("Terminator")
                 break
 
             if mode == consts.DataModeIndicator.ECI:
-                # Flush previous ECI Segment and start a new one (except if this is the first)
-                if eci_segment.tell():
-                    data_buf.write(eci_segment.getvalue().decode(charset))
-                    eci_segment.close()
-                    eci_segment = BytesIO()
+                # End the previous ECI Segment: its text must not end with a partial character
+                text_decoder.decode(b'', final=True)
 
                 # Parse the ECI Designator of the new starting ECI Segment
-                eci_charset = self._parse_eci_designator(bitstream)
-                charset = consts.Eci.CHARSETS[eci_charset]
+                eci = QrCodeDecoder._parse_eci_designator(bitstream)
+                text_decoder = codecs.getincrementaldecoder(consts.Eci.CHARSETS[eci])()
+                if debug:
+                    _LOGGER.debug("ECI Charset: %d (%s)", eci, consts.Eci.CHARSETS[eci])
                 continue
 
-
-            print("Segment")
-            print(f"    Mode: {consts.DATA_MODE_INDICATOR[mode]}")
+            if mode not in segment_decoders:
+                raise ValueError("This segment mode is not supported")
 
             # Determine the number of characters encoded
-            char_count = int(bitstream.read(consts.char_count_bit_len(self.version, mode)), 2)
-            print(f"    Char count: {char_count}")
-
-            if mode == consts.DataModeIndicator.EIGHTBITBYTE:
-                eci_segment.write(self._decode_eightbitbyte_segment(bitstream, char_count))
-            elif mode == consts.DataModeIndicator.ALPHANUMERIC:
-                eci_segment.write(self._decode_alphanumeric_segment(bitstream, char_count))
-            elif mode == consts.DataModeIndicator.NUMERIC:
-                eci_segment.write(self._decode_numeric_segment(bitstream, char_count))
+            char_count = bitstream.read_bits(consts.char_count_bit_len(version, mode))
+
+            seg_data = segment_decoders[mode](bitstream, char_count)
+
+            # Kanji segments are always Shift JIS, whatever the ECI in use
+            if mode == consts.DataModeIndicator.KANJI:
+                text = seg_data.decode(consts.KANJI_CHARSET)
             else:
-                raise ValueError("This segment mode is not supported")
-        bitstream.close()
+                text = text_decoder.decode(seg_data)
 
-        # Flush last ECI Segment
-        data_buf.write(eci_segment.getvalue().decode(charset))
-        eci_segment.close()
+            segment = Segment(consts.DataModeIndicator(mode), char_count, bit_offset, eci,
+                    seg_data, text)
+            if debug:
+                _LOGGER.debug("Segment: %s", segment)
+            yield segment
 
-        data = data_buf.getvalue()
-        data_buf.close()
-        print()
-        return data
+        # End the last ECI Segment
+        text_decoder.decode(b'', final=True)
 
     @staticmethod
     def _decode_numeric_segment(bitstream, char_count):
         # Safety check for crazy char_count (overflow)
-        remaining_bits = len(bitstream.getvalue()) - bitstream.tell()
+        remaining_bits = bitstream.remaining()
         needed_bits = consts.NUM_TRIPLE_BIT_LEN * (char_count // 3)
         rest = char_count % 3
         if rest == 2:
@@ -376,35 +617,34 @@ class QrCodeDecoder:
 
         # Handle a multiple of 3 digits
         for _ in range (0, char_count - rest, 3):
-            triple_digit = int(bitstream.read(consts.NUM_TRIPLE_BIT_LEN), 2)
+            triple_digit = bitstream.read_bits(consts.NUM_TRIPLE_BIT_LEN)
             if triple_digit > consts.NUM_TRIPLE_MAX:
                 raise ValueError("Numeric charset overflow")
             seg_data_buf.write(bytes(format(triple_digit, '03d'), 'ascii'))
 
         # Handle the case where there are 2 digits left at the end
         if rest == 2:
-            double_digit = int(bitstream.read(consts.NUM_DOUBLE_BIT_LEN), 2)
+            double_digit = bitstream.read_bits(consts.NUM_DOUBLE_BIT_LEN)
             if double_digit > consts.NUM_DOUBLE_MAX:
                 raise ValueError("Numeric charset overflow")
             seg_data_buf.write(bytes(format(double_digit, '02d'), 'ascii'))
 
         # Handle the case where there is 1 digit left at the end
         elif rest == 1:
-            single_digit = int(bitstream.read(consts.NUM_SINGLE_BIT_LEN), 2)
+            single_digit = bitstream.read_bits(consts.NUM_SINGLE_BIT_LEN)
             if single_digit > consts.NUM_SINGLE_MAX:
                 raise ValueError("Numeric charset overflow")
             seg_data_buf.write(bytes(str(single_digit), 'ascii'))
 
         seg_data = seg_data_buf.getvalue()
         seg_data_buf.close()
-        print(f"    {seg_data}")
 
         return seg_data
 
     @staticmethod
     def _decode_alphanumeric_segment(bitstream, char_count):
         # Safety check for crazy char_count (overflow)
-        remaining_bits = len(bitstream.getvalue()) - bitstream.tell()
+        remaining_bits = bitstream.remaining()
         needed_bits = consts.ALPHANUM_DOUBLE_BIT_LEN * (char_count >> 1) \
             + consts.ALPHANUM_SINGLE_BIT_LEN * (char_count & 1)
         if needed_bits > remaining_bits:
@@ -414,7 +654,7 @@ class QrCodeDecoder:
 
         # Handle an even number of characters
         for _ in range(0, char_count & ~1, 2):
-            double_char = int(bitstream.read(consts.ALPHANUM_DOUBLE_BIT_LEN), 2)
+            double_char = bitstream.read_bits(consts.ALPHANUM_DOUBLE_BIT_LEN)
             if double_char > consts.ALPHANUM_DOUBLE_MAX:
                 raise ValueError("Alphanumeric charset overflow")
             char1 = double_char // consts.ALPHANUM_CHARSET_LEN
@@ -424,27 +664,107 @@ class QrCodeDecoder:
 
         # Handle last character if the number of characters is odd
         if char_count & 1:
-            char = int(bitstream.read(consts.ALPHANUM_SINGLE_BIT_LEN), 2)
+            char = bitstream.read_bits(consts.ALPHANUM_SINGLE_BIT_LEN)
             if char > consts.ALPHANUM_SINGLE_MAX:
                 raise ValueError("Alphanumeric charset overflow")
             seg_data_buf.write(bytes(consts.ALPHANUM_CHARSET[char], 'ascii'))
 
         seg_data = seg_data_buf.getvalue()
         seg_data_buf.close()
-        print(f"    {seg_data}")
 
         return seg_data
 
     @staticmethod
     def _decode_eightbitbyte_segment(bitstream, char_count):
-        remaining_bits = len(bitstream.getvalue()) - bitstream.tell()
+        remaining_bits = bitstream.remaining()
         needed_bits = consts.EIGHTBIT_BIT_LEN * char_count
         if needed_bits > remaining_bits:
             raise ValueError("Character count indicator overflow for 8bit-byte mode segment")
 
-        seg_data = bytearray(char_count)
-        for char_idx in range(char_count):
-            seg_data[char_idx] = int(bitstream.read(consts.EIGHTBIT_BIT_LEN), 2)
-        print(f"    {seg_data}")
+        return bitstream.read_bytes(char_count)
 
-        return seg_data
+    @staticmethod
+    def _decode_kanji_segment(bitstream, char_count):
+        remaining_bits = bitstream.remaining()
+        needed_bits = consts.KANJI_BIT_LEN * char_count
+        if needed_bits > remaining_bits:
+            raise ValueError("Character count indicator overflow for kanji segment")
+
+        # Shift JIS double bytes (their validity is checked when decoding the text)
+        kanji_table = consts.kanji_table()
+        return b''.join([kanji_table[bitstream.read_bits(consts.KANJI_BIT_LEN)] \
+                for _ in range(char_count)])
+
+
+def warm_up(versions=None, engine=None):
+    """Build the per-version tables (of an engine) ahead of time (all versions by default)"""
+
+    if versions is None:
+        versions = range(1, len(consts.EC_BLOCKS))
+
+    engine = engines.get_engine(engine)
+    for version in versions:
+        layout.get_layout(version)
+        engine.warm_up(version)
+        for ec_config in consts.EC_BLOCKS[version]:
+            for _, block_config in ec_config:
+                consts.reed_solomon(*block_config)
+
+def _split_item(item):
+    """Split a decode_many item into its QR Code and its size (None if not given)"""
+
+    if isinstance(item, tuple) and len(item) == 2 \
+            and isinstance(item[0], (bytes, bytearray, memoryview)) and isinstance(item[1], int):
+        return item
+    return item, None
+
+def _decode_one(index, qr_code, size, engine):
+    try:
+        return BatchResult(index, QrCodeDecoder(qr_code, engine, size).decode(), None)
+    except Exception as e: # pylint: disable=broad-exception-caught
+        return BatchResult(index, None, e)
+
+def _pickle_items(iterable):
+    """Pickle the items for the workers, a failure being reported as the item error
+
+    Memoryviews (e.g. corpus entries) can't be pickled: they are copied to bytes.
+    """
+
+    for index, item in enumerate(iterable):
+        try:
+            qr_code, size = _split_item(item)
+            if isinstance(qr_code, memoryview):
+                qr_code = qr_code.tobytes()
+            yield index, pickle.dumps((qr_code, size), pickle.HIGHEST_PROTOCOL), None
+        except Exception as e: # pylint: disable=broad-exception-caught
+            yield index, None, e
+
+def _decode_pickled(item, engine):
+    index, pickled, error = item
+    if error is not None:
+        return BatchResult(index, None, error)
+    return _decode_one(index, *pickle.loads(pickled), engine)
+
+def decode_many(iterable, workers=None, chunksize=16, ordered=True, engine=None, versions=None):
+    """Decode many QR Codes, fanning out to a pool of worker processes
+
+    The items are QR Codes (in any form accepted by QrCodeDecoder), or
+    (packed QR Code, size) pairs for the bit-packed ones.
+    Yield a BatchResult for each input, holding its index in the iterable.
+    A failure only affects its own item: its error is reported in the BatchResult.
+    The results are yielded in input order, unless ordered is False (then
+    they are yielded as soon as they are available).
+    Each worker builds the tables of the given versions (all by default) once, at startup.
+    With workers=1, everything is done in the current process.
+    """
+
+    if workers == 1:
+        warm_up(versions, engine)
+        for index, item in enumerate(iterable):
+            yield _decode_one(index, *_split_item(item), engine)
+        return
+
+    decode_pickled = partial(_decode_pickled, engine=engine)
+    with Pool(workers, initializer=warm_up, initargs=(versions, engine)) as pool:
+        imap = pool.imap if ordered else pool.imap_unordered
+        yield from imap(decode_pickled, _pickle_items(iterable), chunksize)
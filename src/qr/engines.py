@@ -0,0 +1,281 @@
+from collections import namedtuple
+from functools import lru_cache
+
+from qr import consts, layout
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Both engines work on bit-packed matrices: row-major, MSb first, each row being
+# padded with zeroes up to a whole number of bytes (the stride).
+# This is also the packed binary input format accepted by the engines.
+
+def packed_stride(size):
+    return (size + 7) // 8
+
+def _row_to_int(row, size):
+    """Convert a row (int, '0'/'1' string, or sequence of modules) to an int"""
+
+    if isinstance(row, int):
+        if row < 0:
+            raise ValueError("QR module values should be 0 or 1")
+        if row >> size:
+            raise ValueError("QR Matrix needs to be a square")
+        return row
+
+    if not isinstance(row, str):
+        row = ''.join(str(int(module)) for module in row)
+
+    if len(row) != size:
+        raise ValueError("QR Matrix needs to be a square")
+
+    # All the characters have to be binary digits
+    if row.lstrip('01'):
+        raise ValueError("QR module values should be 0 or 1")
+
+    return int(row, 2) if row else 0
+
+def _read_rows(qr_code):
+    """Read the rows of an ASCII '0'/'1' file"""
+
+    with open(qr_code, 'r', encoding="ascii") as file:
+        return [row.strip() for row in file]
+
+def load_packed(qr_code, size=None):
+    """Load a QR Code matrix in its bit-packed form
+
+    qr_code can be:
+    - the path of an ASCII file with one row of '0'/'1' per line
+    - a sequence of rows: '0'/'1' strings, ints (MSb is the first column) or sequences of modules
+    - a bytes-like object, already bit-packed (size is then mandatory)
+    - a 2-D NumPy array of modules
+
+    Return the size and a bytes-like object. Bytes-like inputs are not copied,
+    so they must not be mutated while in use.
+    """
+
+    if isinstance(qr_code, (bytes, bytearray, memoryview)):
+        if size is None:
+            raise ValueError("The size of a packed QR matrix is needed")
+        packed = memoryview(qr_code).cast('B')
+        if len(packed) != size * packed_stride(size):
+            raise ValueError("Packed QR Matrix length doesn't match its size")
+        return size, packed
+
+    if np is not None and isinstance(qr_code, np.ndarray):
+        matrix = _check_ndarray(qr_code, size)
+        return matrix.shape[0], np.packbits(matrix, axis=1).tobytes()
+
+    rows = _read_rows(qr_code) if isinstance(qr_code, str) else qr_code
+
+    height = len(rows)
+    if size is not None and size != height:
+        raise ValueError("QR Matrix size mismatch")
+
+    stride = packed_stride(height)
+    padding = 8 * stride - height
+    return height, b''.join((_row_to_int(row, height) << padding).to_bytes(stride, 'big') \
+            for row in rows)
+
+
+PackedMatrix = namedtuple('PackedMatrix', ['size', 'stride', 'data'])
+
+@lru_cache(maxsize=None)
+def _packed_data_modules(version):
+    """Byte index and bit shift of each data module (without remainder bits)"""
+
+    version_layout = layout.get_layout(version)
+    stride = packed_stride(version_layout.size)
+
+    return tuple((row * stride + (col >> 3), 7 - (col & 7)) \
+            for row, col in version_layout.data_modules[:8 * version_layout.nb_codewords])
+
+class PythonEngine:
+    """Pure Python decoding engine
+
+    The module matrix is a PackedMatrix.
+    """
+
+    name = 'python'
+
+    @staticmethod
+    def warm_up(version):
+        """Build the (lazily built) tables of a version"""
+
+        _packed_data_modules(version)
+        for mask_pattern in range(len(consts.FORMAT_MASK_PATTERNS)):
+            layout.get_data_mask(version, mask_pattern)
+
+    @staticmethod
+    def load(qr_code, size=None):
+        size, packed = load_packed(qr_code, size)
+        return size, PackedMatrix(size, packed_stride(size), packed)
+
+    @staticmethod
+    def pack(matrix):
+        return matrix.data
+
+    @staticmethod
+    def module(matrix, row, col):
+        row %= matrix.size
+        col %= matrix.size
+        return (matrix.data[row * matrix.stride + (col >> 3)] >> (7 - (col & 7))) & 1
+
+    @staticmethod
+    def gather_codewords(matrix, version_layout):
+        """Gather the (masked) data modules in reading order, packed in one int"""
+
+        data = matrix.data
+        bits = bytes((data[idx] >> shift) & 1 \
+                for idx, shift in _packed_data_modules(version_layout.version))
+
+        return int(bits.translate(layout.BIT_CHARS), 2)
+
+    @staticmethod
+    def unmask_codewords(codewords, version_layout, mask_pattern):
+        codewords ^= layout.get_data_mask(version_layout.version, mask_pattern)
+        return codewords.to_bytes(version_layout.nb_codewords, 'big')
+
+    @staticmethod
+    def deinterlace_blocks(codewords, version_layout, ec_level):
+        gather = codewords.__getitem__
+
+        return [[bytearray(map(gather, data_idx)), bytearray(map(gather, error_idx))] \
+                for data_idx, error_idx in version_layout.blocks[ec_level]]
+
+
+def _check_ndarray(matrix, size=None):
+    if matrix.ndim != 2 or matrix.shape[0] != matrix.shape[1]:
+        raise ValueError("QR Matrix needs to be a square")
+
+    if size is not None and size != matrix.shape[0]:
+        raise ValueError("QR Matrix size mismatch")
+
+    if matrix.dtype != np.bool_ and not np.issubdtype(matrix.dtype, np.integer):
+        raise ValueError("QR module values should be booleans or integers")
+
+    if matrix.dtype != np.bool_ and ((matrix != 0) & (matrix != 1)).any():
+        raise ValueError("QR module values should be 0 or 1")
+
+    return matrix
+
+@lru_cache(maxsize=None)
+def _numpy_data_modules(version):
+    """Row, byte column and bit shift arrays of the data modules (without remainder bits)"""
+
+    version_layout = layout.get_layout(version)
+    coords = np.array(version_layout.data_modules[:8 * version_layout.nb_codewords],
+            dtype=np.intp)
+    cols = coords[:, 1]
+    return coords[:, 0].copy(), cols >> 3, (7 - (cols & 7)).astype(np.uint8)
+
+@lru_cache(maxsize=None)
+def _numpy_data_mask(version, mask_pattern):
+    data_mask = layout.get_data_mask(version, mask_pattern)
+    nb_codewords = layout.get_layout(version).nb_codewords
+    return np.unpackbits(np.frombuffer(data_mask.to_bytes(nb_codewords, 'big'), dtype=np.uint8))
+
+class NumpyEngine:
+    """NumPy decoding engine
+
+    The module matrix is a bit-packed 2-D uint8 ndarray (one row per matrix row).
+    Per-module Python loops are replaced by array operations.
+    """
+
+    name = 'numpy'
+
+    @staticmethod
+    def warm_up(version):
+        _numpy_data_modules(version)
+        for mask_pattern in range(len(consts.FORMAT_MASK_PATTERNS)):
+            _numpy_data_mask(version, mask_pattern)
+
+    @staticmethod
+    def load(qr_code, size=None):
+        if isinstance(qr_code, np.ndarray):
+            matrix = _check_ndarray(qr_code, size)
+            return matrix.shape[0], np.packbits(matrix, axis=1)
+
+        if isinstance(qr_code, str):
+            qr_code = _read_rows(qr_code)
+
+        # Validate and convert all the modules of '0'/'1' strings at once
+        if not isinstance(qr_code, (bytes, bytearray, memoryview)) \
+                and qr_code and all(isinstance(row, str) for row in qr_code):
+            height = len(qr_code)
+            if any(len(row) != height for row in qr_code):
+                raise ValueError("QR Matrix needs to be a square")
+
+            matrix = np.frombuffer(''.join(qr_code).encode('ascii'), dtype=np.uint8) - ord('0')
+            matrix = _check_ndarray(matrix.reshape(height, height), size)
+            return height, np.packbits(matrix, axis=1)
+
+        # Bytes-like objects are not copied
+        size, packed = load_packed(qr_code, size)
+        return size, np.frombuffer(packed, dtype=np.uint8).reshape(size, packed_stride(size))
+
+    @staticmethod
+    def pack(matrix):
+        return matrix.tobytes()
+
+    @staticmethod
+    def module(matrix, row, col):
+        col %= matrix.shape[0]
+        return (int(matrix[row, col >> 3]) >> (7 - (col & 7))) & 1
+
+    @staticmethod
+    def gather_codewords(matrix, version_layout):
+        rows, byte_cols, shifts = _numpy_data_modules(version_layout.version)
+        return (matrix[rows, byte_cols] >> shifts) & 1
+
+    @staticmethod
+    def unmask_codewords(codewords, version_layout, mask_pattern):
+        return np.packbits(codewords ^ _numpy_data_mask(version_layout.version, mask_pattern))
+
+    @staticmethod
+    def deinterlace_blocks(codewords, version_layout, ec_level):
+        ec_config = consts.EC_BLOCKS[version_layout.version][ec_level]
+
+        # There are up to 2 block groups, the blocks of the second one have one more data word
+        nb_blocks = sum(nb_group_blocks for nb_group_blocks, _ in ec_config)
+        _, (nb_words, nb_data_words, _) = ec_config[0]
+        nb_error_words = nb_words - nb_data_words
+        nb_long_blocks = nb_blocks - ec_config[0][0]
+
+        # Codewords are interleaved: word index is the row, block index is the column
+        data_end = nb_blocks * nb_data_words
+        data = codewords[:data_end].reshape(nb_data_words, nb_blocks).T
+        extra_end = data_end + nb_long_blocks
+        extra = codewords[data_end:extra_end]
+        error = codewords[extra_end:].reshape(nb_error_words, nb_blocks).T
+
+        blocks = []
+        for block_idx in range(nb_blocks):
+            data_words = bytearray(data[block_idx].tobytes())
+            long_idx = block_idx - (nb_blocks - nb_long_blocks)
+            if long_idx >= 0:
+                data_words.append(extra[long_idx])
+            blocks.append([data_words, bytearray(error[block_idx].tobytes())])
+        return blocks
+
+
+ENGINES = {engine.name: engine for engine in (PythonEngine, NumpyEngine)}
+
+def get_engine(name=None):
+    """Get a decoding engine by name (pure Python by default)
+
+    The NumPy engine falls back to the pure Python one when NumPy is absent.
+    """
+
+    if name is None:
+        name = PythonEngine.name
+
+    if name not in ENGINES:
+        raise ValueError(f"Unknown decoding engine: {name}")
+
+    if name == NumpyEngine.name and np is None:
+        return PythonEngine
+
+    return ENGINES[name]
@@ -0,0 +1,178 @@
+from collections import namedtuple
+from functools import lru_cache
+
+from qr import consts
+
+# Everything about the placement of the modules that only depends on the version.
+# - fp_mask: size x size tuple of tuples, 1 for function pattern modules
+# - data_modules: (row, col) of every data module, in reading order
+# - nb_codewords: total number of codewords (the remainder bits are dropped)
+# - blocks: for each EC level, for each block, the (data, error) tuples of
+#           the indexes of its codewords in the interleaved codewords sequence
+VersionLayout = namedtuple('VersionLayout',
+        ['version', 'size', 'fp_mask', 'data_modules', 'nb_codewords', 'blocks'])
+
+# Translation of module values (0 or 1) to binary digits
+BIT_CHARS = bytes.maketrans(b'\x00\x01', b'01')
+
+def version_size(version):
+    return 21 + 4 * (version - 1)
+
+def compute_alignment_patterns(version):
+    ap_db = consts.ALIGNMENT_PATTERNS[version]
+    my_ap = []
+    for coord1 in ap_db:
+        for coord2 in ap_db:
+            # No alignment pattern at (6, 6) because of NW finder pattern
+            if coord1 == ap_db[0] and coord2 == ap_db[0]:
+                continue
+
+            # No alignment pattern at (6, z) and (z, 6) (z = ap_db[-1])
+            # Because of NE and SW finder patterns
+            if {coord1, coord2} == {ap_db[0], ap_db[-1]}:
+                continue
+
+            my_ap.append((coord1, coord2))
+    return my_ap
+
+def compute_function_patterns_mask(version):
+    size = version_size(version)
+    fp_mask = [[0] * size for _ in range(size)]
+
+    # Finder Patterns and Spacers
+    # Formats
+    # The Dark Module
+    for i in range(consts.FINDER_PATTERN_SIZE + 1):
+        for j in range(consts.FINDER_PATTERN_SIZE):
+            j_mirror = -consts.FINDER_PATTERN_SIZE + j
+
+            fp_mask[i][j] = 1
+            fp_mask[i][j_mirror] = 1
+            fp_mask[j_mirror][i] = 1
+
+        fp_mask[i][consts.FINDER_PATTERN_SIZE] = 1
+
+    # Timing Patterns
+    for i in range(consts.FINDER_PATTERN_SIZE, size - consts.FINDER_PATTERN_SIZE):
+        fp_mask[consts.TIMING_PATTERN_ROW_COL][i] = 1
+        fp_mask[i][consts.TIMING_PATTERN_ROW_COL] = 1
+
+    if version < consts.ALIGNMENT_PATTERN_VERSION_START:
+        return fp_mask
+
+    # Alignment Patterns
+    for ap_center_row, ap_center_col in compute_alignment_patterns(version):
+        for i in range(ap_center_row - 2, ap_center_row + 3, 1):
+            for j in range(ap_center_col - 2, ap_center_col + 3, 1):
+                fp_mask[i][j] = 1
+
+    if version < consts.VERSION_BLOCK_VERSION_START:
+        return fp_mask
+
+    # Versions
+    for i in range(consts.VERSION_DIM[0]):
+        for j in range(consts.VERSION_DIM[1]):
+            j_mirror = -consts.FINDER_PATTERN_SIZE - consts.VERSION_DIM[1] + j
+            fp_mask[j_mirror][i] = 1
+            fp_mask[i][j_mirror] = 1
+
+    return fp_mask
+
+def compute_data_modules(fp_mask):
+    size = len(fp_mask)
+    data_modules = []
+    go_up = True
+
+    # Outer loop: for each "column couple"
+    for column_right in range(size - 1, 0, -2):
+        # Skip Vertical Timing Pattern
+        if column_right <= consts.TIMING_PATTERN_ROW_COL:
+            column_right = column_right - 1
+
+        # Configure middle loop range depending on whether we are going up or down
+        row_start = size - 1 if go_up else 0
+        row_end = -1 if go_up else size
+        row_dir = -1 if go_up else 1
+
+        # Middle loop: Row up up up, or row down down down
+        for row in range(row_start, row_end, row_dir):
+
+            # Inner loop: Column right left
+            for i in range(2):
+                col = column_right - i
+
+                # Skip Function Patterns
+                if not fp_mask[row][col]:
+                    data_modules.append((row, col))
+
+        # We've reached symbol bounds, let's reverse the middle loop direction
+        go_up = not go_up
+
+    return data_modules
+
+def compute_blocks(ec_config):
+    # Indexes of the data and error codewords of each block
+    blocks = []
+    _, (max_nb_words, max_nb_data_words, _) = ec_config[-1] # Last blocks have max word number
+    max_words_per_block = [max_nb_data_words, max_nb_words - max_nb_data_words]
+    for nb_blocks, (nb_words, nb_data_words, _) in ec_config:
+        nb_error_words = nb_words - nb_data_words
+        for _ in range(nb_blocks):
+            blocks.append([[None] * nb_data_words, [None] * nb_error_words])
+
+    # Assign each interleaved codeword index to its block, so that the following:
+    # B0D0 B1D0 B2D0 B0D1 B1D1 B2D1 B0E0 B1E0 B2E0 B0E1 B1E1 B2E1
+    # can be gathered with the following layout:
+    # B0D0 B0D1 B0E0 B0E1 B1D0 B1D1 B1E0 B1E1 B2D0 B2D1 B2E0 B2D1
+    codeword_idx = 0
+
+    # All data words first, then all error words
+    for is_error_word in range(2):
+        # For each word
+        for word_idx in range(max_words_per_block[is_error_word]):
+            block_idx = 0
+            # For each block group
+            for nb_blocks, (nb_words, nb_data_words, _) in ec_config:
+                nb_words = [nb_data_words, nb_words - nb_data_words]
+
+                # When some blocks are shorter than others, we need to skip
+                # non-existing words for those blocks
+                if word_idx == nb_words[is_error_word]:
+                    block_idx += nb_blocks
+                    continue
+
+                # For each block of that block group, take the next codeword
+                for _ in range(nb_blocks):
+                    blocks[block_idx][is_error_word][word_idx] = codeword_idx
+                    codeword_idx += 1
+                    block_idx += 1
+
+    return tuple((tuple(data), tuple(error)) for data, error in blocks)
+
+@lru_cache(maxsize=None)
+def get_layout(version):
+    """Get the (immutable, computed once per process) layout of a version"""
+
+    if version not in range(1, len(consts.EC_BLOCKS)):
+        raise ValueError("Invalid QR code version")
+
+    fp_mask = compute_function_patterns_mask(version)
+    data_modules = compute_data_modules(fp_mask)
+    blocks = tuple(compute_blocks(ec_config) for ec_config in consts.EC_BLOCKS[version])
+
+    return VersionLayout(version, len(fp_mask), tuple(tuple(row) for row in fp_mask),
+            tuple(data_modules), len(data_modules) // 8, blocks)
+
+@lru_cache(maxsize=None)
+def get_data_mask(version, mask_pattern):
+    """Get the mask pattern bits of the data modules of a version, packed as codewords
+
+    Unmasking the (packed) codewords then only takes a single XOR.
+    The combinations are computed lazily, only when they are met.
+    """
+
+    version_layout = get_layout(version)
+    mask_function = consts.FORMAT_MASK_PATTERNS[mask_pattern]
+    bits = bytes(mask_function(row, col) for row, col in version_layout.data_modules)
+
+    return int(bits[:8 * version_layout.nb_codewords].translate(BIT_CHARS), 2)
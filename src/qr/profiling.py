@@ -0,0 +1,58 @@
+# Observation of the decoding stages
+#
+# An observer given to QrCodeDecoder(..., observer=...) receives, for each
+# stage of the decoding, a start event and an end event (only if the stage
+# succeeds), timestamped with time.perf_counter_ns().
+#
+# Stages and the counters of their end event:
+# - load: modules (of the matrix)
+# - format: modules (of the format and version information)
+# - unfold: modules (data modules gathered)
+# - unmask: codewords
+# - deinterlace: blocks
+# - correct: errors_corrected (codewords)
+# - parse: segments, bytes (decoded)
+#
+# Without an observer, the decoder doesn't take any timestamp.
+
+from collections import Counter, defaultdict
+
+class DecodeObserver:
+    """Base class of the decode observers (ignores all the events)"""
+
+    def stage_start(self, stage, timestamp_ns):
+        pass
+
+    def stage_end(self, stage, timestamp_ns, counters):
+        pass
+
+class StageProfiler(DecodeObserver):
+    """Accumulate the duration, number of runs and counters of each stage
+
+    A single profiler can observe any number of (sequential) decodings.
+    """
+
+    def __init__(self):
+        self.starts = {}
+        self.calls = Counter()
+        self.durations_ns = Counter()
+        self.counters = defaultdict(Counter)
+
+    def stage_start(self, stage, timestamp_ns):
+        self.starts[stage] = timestamp_ns
+
+    def stage_end(self, stage, timestamp_ns, counters):
+        self.calls[stage] += 1
+        self.durations_ns[stage] += timestamp_ns - self.starts.pop(stage)
+        self.counters[stage].update(counters)
+
+    def report(self):
+        """Get a human readable summary, one line per stage"""
+
+        lines = []
+        for stage, calls in self.calls.items():
+            counters = ', '.join(f"{name}={value}" \
+                    for name, value in sorted(self.counters[stage].items()))
+            lines.append(f"{stage:<12}{calls:>8} runs{self.durations_ns[stage] / 1000:>12.1f}us"
+                    f"  {counters}".rstrip())
+        return '\n'.join(lines)
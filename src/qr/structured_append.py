@@ -0,0 +1,110 @@
+# Reassembly of messages split over several symbols with Structured Append
+#
+# The symbols of a sequence can be decoded independently (e.g. with
+# decoder.decode_many) and fed in any order: a message is emitted as soon as
+# its last symbol arrives. Incomplete sequences are buffered by parity (and
+# number of symbols); the least recently fed ones are dropped when there are
+# too many of them.
+
+from collections import OrderedDict, namedtuple
+from functools import reduce
+from operator import xor
+
+from qr import consts
+
+# A message reassembled from one or more symbols
+# - text: concatenated text of the symbols
+# - data: concatenated raw bytes of the symbols
+# - parity: Structured Append parity (None if the message came in a single symbol)
+# - results: DecodeResult of each symbol, in sequence order
+Message = namedtuple('Message', ['text', 'data', 'parity', 'results'])
+
+def parity(data):
+    """Compute the Structured Append parity of some message data"""
+    return reduce(xor, data, 0)
+
+class StructuredAppendAssembler:
+    """Reassemble messages from decoded symbols (DecodeResult), fed in any order
+
+    At most max_sets incomplete sequences are kept.
+    """
+
+    def __init__(self, max_sets=64):
+        if max_sets < 1:
+            raise ValueError("At least one incomplete sequence has to be kept")
+
+        self.max_sets = max_sets
+        # (parity, total) -> DecodeResult of each symbol (None if not received yet)
+        self.sets = OrderedDict()
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.sets)
+
+    def add(self, result):
+        """Feed a decoded symbol, return the Message it completes (None if incomplete)
+
+        A symbol without Structured Append header is a whole Message on its own.
+        A ValueError is raised for an invalid header, when a symbol conflicts with the one of its
+        position, or when the parity of a complete message mismatches: the
+        sequence is then dropped.
+        """
+
+        header = result.structured_append
+        if header is None:
+            return Message(result.text, result.data, None, [result])
+
+        if header.total not in range(1, consts.STRUCTURED_APPEND_MAX_SYMBOLS + 1) \
+                or header.index not in range(header.total):
+            raise ValueError("Invalid Structured Append header")
+
+        key = (header.parity, header.total)
+        pieces = self.sets.get(key)
+        if pieces is None:
+            pieces = self.sets[key] = [None] * header.total
+            if len(self.sets) > self.max_sets:
+                self.sets.popitem(last=False)
+                self.evictions += 1
+        else:
+            self.sets.move_to_end(key)
+
+        # The same symbol is often read several times
+        previous = pieces[header.index]
+        if previous is not None and previous.data != result.data:
+            del self.sets[key]
+            raise ValueError("Structured Append symbols conflict")
+        pieces[header.index] = result
+
+        if None in pieces:
+            return None
+
+        del self.sets[key]
+
+        data = b''.join(piece.data for piece in pieces)
+        if parity(data) != header.parity:
+            raise ValueError("Structured Append parity mismatch")
+
+        return Message(''.join(piece.text for piece in pieces), data, header.parity, pieces)
+
+    def clear(self):
+        self.sets.clear()
+
+def assemble(results, max_sets=64, on_error=None):
+    """Reassemble decoded symbols, yielding each Message as soon as it is complete
+
+    e.g. assemble(item.result for item in decode_many(symbols) if item.result)
+    A bad sequence (conflicting symbols, parity mismatch) is dropped without
+    affecting the others: on_error(result, error) is called, if given.
+    """
+
+    assembler = StructuredAppendAssembler(max_sets)
+    for result in results:
+        try:
+            message = assembler.add(result)
+        except ValueError as e:
+            if on_error is not None:
+                on_error(result, e)
+            continue
+
+        if message is not None:
+            yield message
@@ -1,7 +1,8 @@
 import pytest
 
 from ec.bch import BCH
-from ec.bch import BchDecodingFailure
+from ec.bch import BchDecodingFailure, CyclicEncoder, binary_poly_mod, generator_polynomial
+from ec.galois import CarrylessBinaryGaloisField
 
 class TestSyndromes:
     def test_syndrome_zero(self):
@@ -146,3 +147,123 @@ class TestDecode:
 
             with pytest.raises(BchDecodingFailure):
                 error, corrected = self.QR_BCH.decode(format_wrong)
+
+class TestDecodeLongCode:
+    def test_carryless_field(self):
+        # BCH(16383, 16355) over GF(2^14), whose tables don't fit the budget
+        bch = BCH(14, 16355, 2, 0)
+        assert isinstance(bch.gf, CarrylessBinaryGaloisField)
+
+        assert bch.decode(0) == (False, 0)
+        assert bch.decode(1 << 9000 | 1 << 16382) == (True, 0)
+        assert bch.decode(1 << 42) == (True, 0)
+        assert bch.decode(0b11 << 3000) == (True, 0)
+        with pytest.raises(BchDecodingFailure):
+            bch.decode(0b1011 << 3000)
+
+class TestSyndromesPacked:
+    def test_same_as_polynomial_evaluation(self):
+        for bin_bch in (BCH(4, 5, 3, 0), BCH(5, 21, 2, 0), BCH(10, 1003, 2, 0)):
+            gf = bin_bch.gf
+            for r in (0, 1, 0b11101100110100010101101001, 0b101 << (bin_bch.n - 3),
+                    (1 << bin_bch.n) - 1):
+                poly = bin_bch.binary_to_list(r)
+                expected = [gf.gf_poly_eval(poly, gf.gf_exp(j)) for j in range(1, 2 * bin_bch.t + 1)]
+                assert bin_bch.syndromes(r) == expected
+                assert bin_bch.unpack_syndromes(bin_bch.syndromes_packed(r)) == expected
+
+    def test_long_code_without_byte_tables(self):
+        bin_bch = BCH(11, 2025, 2, 0)
+        bin_bch.syndromes_packed(0)
+        assert bin_bch.syndrome_byte_tables is None
+
+        gf = bin_bch.gf
+        r = 1 | 1 << 1000 | 1 << 2046
+        assert bin_bch.syndromes(r) == [gf.gf_exp(0) ^ gf.gf_exp(1000 * j) ^ gf.gf_exp(2046 * j) \
+                for j in range(1, 5)]
+
+    def test_no_tables_over_memory_budget(self):
+        bin_bch = BCH(16, 65535 - 64, 4, 0)
+        assert not bin_bch.use_syndrome_positions
+        assert bin_bch.decode(1 << 5 | 1 << 40000 | 1 << 65534) == (True, 0)
+        assert bin_bch.syndrome_positions is None
+
+        # Direct computation and tables agree
+        small_bch = BCH(5, 21, 2, 0)
+        r = 0b11101100110100010101101001
+        expected = small_bch.syndromes(r)
+        small_bch.use_syndrome_positions = False
+        small_bch.syndrome_positions = small_bch.syndrome_byte_tables = None
+        assert small_bch.syndromes(r) == expected
+
+class TestErrorTable:
+    def test_strategy_selection(self):
+        assert BCH(4, 5, 3, 0).use_error_table
+        assert not BCH(4, 5, 3, 0, error_table_max_size=574).use_error_table
+        assert BCH(4, 5, 3, 0, error_table_max_size=575).use_error_table
+        assert not BCH(10, 1003, 2, 0).use_error_table
+
+    def test_same_as_algebraic(self):
+        table_bch = BCH(4, 5, 3, 0)
+        algebraic_bch = BCH(4, 5, 3, 0, error_table_max_size=0)
+
+        for r in range(1 << 15):
+            try:
+                expected = algebraic_bch.decode(r)
+            except BchDecodingFailure:
+                with pytest.raises(BchDecodingFailure):
+                    table_bch.decode(r)
+            else:
+                assert table_bch.decode(r) == expected
+        assert len(table_bch.error_table) == 575
+
+class TestGeneratorPolynomial:
+    def test_known_generators(self):
+        assert generator_polynomial(4, 3) == 0b10100110111 # QR Code format
+        assert generator_polynomial(4, 2) == 0b111010001
+        assert generator_polynomial(5, 2) == 0b11101101001
+        assert generator_polynomial(4, 1) == 0b10011
+        assert BCH(4, 5, 3, 0).g == 0b10100110111
+
+    def test_wrong_generator(self):
+        with pytest.raises(ValueError):
+            BCH(4, 5, 3, 0b10100110101)
+        with pytest.raises(ValueError):
+            BCH(4, 6, 3, 0)
+
+    def test_binary_poly_mod_zero_divisor(self):
+        with pytest.raises(ZeroDivisionError):
+            binary_poly_mod(0b1011, 0)
+
+class TestEncode:
+    QR_BCH = BCH(4, 5, 3, 0)
+
+    def test_encode_qr_code_formats(self):
+        formats = [self.QR_BCH.encode(data) ^ TestDecode.QR_CODE_FORMAT_MASK for data in range(32)]
+        assert sorted(formats) == sorted(TestDecode.QR_CODE_FORMATS)
+
+        with pytest.raises(ValueError):
+            self.QR_BCH.encode(32)
+
+    def test_encode_shortened(self):
+        # QR Code version information: (18, 6) code, whose generator isn't a BCH(2^m - 1, k) one
+        version_bch = CyclicEncoder(18, 6, 0x1F25)
+        assert version_bch.encode(7) == 0x07C94
+        assert version_bch.encode(40) == 0x28C69
+
+        format_bch = CyclicEncoder(15, 5, 0x537)
+        assert [format_bch.encode(data) for data in range(32)] == \
+                [self.QR_BCH.encode(data) for data in range(32)]
+
+        with pytest.raises(ValueError):
+            version_bch.encode(64)
+        with pytest.raises(ValueError):
+            CyclicEncoder(18, 5, 0x1F25)
+
+    def test_encode_decode(self):
+        bin_bch = BCH(10, 1003, 2, 0)
+        data = 0x1234567890abcdef << 900 | 0xfedcba
+        codeword = bin_bch.encode(data)
+        assert codeword >> 20 == data
+        assert bin_bch.syndromes_packed(codeword) == 0
+        assert bin_bch.decode(codeword ^ (1 << 3 | 1 << 1000)) == (True, codeword)
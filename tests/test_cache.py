@@ -0,0 +1,80 @@
+import pytest
+
+from qrcode import QRCode
+
+from qr.cache import DecodeCache
+from qr.decoder import QrCodeDecoder
+
+def make_rows(message):
+    qr_code = QRCode(version=2)
+    qr_code.add_data(message)
+    qr_code.make(fit=False)
+    return [''.join(str(int(module)) for module in row) for row in qr_code.modules]
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestDecodeCache:
+    @pytest.mark.parametrize("engine", ["python", "numpy"])
+    def test_hit(self, engine, monkeypatch):
+        cache = DecodeCache()
+        rows = make_rows("Same frame")
+
+        result = QrCodeDecoder(rows, engine, cache=cache).decode()
+        assert (cache.hits, cache.misses, len(cache)) == (0, 1, 1)
+
+        # A repeated frame is neither unmasked nor parsed again
+        monkeypatch.setattr(QrCodeDecoder, "_unfold_codewords", None)
+        assert QrCodeDecoder(rows, engine, cache=cache).decode() is result
+        assert (cache.hits, cache.misses, len(cache)) == (1, 1, 1)
+
+        # The shared result can't be altered
+        assert isinstance(result.segments, tuple) and isinstance(result.corrections, tuple)
+        with pytest.raises((TypeError, AttributeError)):
+            result.corrections[0] = 1
+
+    def test_key(self):
+        rows = make_rows("Key")
+        packed = QrCodeDecoder(rows).engine.pack(QrCodeDecoder(rows).matrix)
+        assert DecodeCache.key(25, packed) == DecodeCache.key(25, bytes(packed))
+        assert DecodeCache.key(25, packed) != DecodeCache.key(25, packed, True)
+        assert DecodeCache.key(25, packed) != DecodeCache.key(25, b"\0" + bytes(packed)[1:])
+
+    def test_eviction(self):
+        cache = DecodeCache(max_size=2)
+        frames = [make_rows(f"Frame {i}") for i in range(3)]
+
+        for rows in frames[:2]:
+            QrCodeDecoder(rows, cache=cache).decode()
+        # Using the first frame again makes the second one the least recently used
+        QrCodeDecoder(frames[0], cache=cache).decode()
+        QrCodeDecoder(frames[2], cache=cache).decode()
+        assert (cache.hits, cache.misses, cache.evictions, len(cache)) == (1, 3, 1, 2)
+
+        QrCodeDecoder(frames[0], cache=cache).decode()
+        QrCodeDecoder(frames[1], cache=cache).decode()
+        assert (cache.hits, cache.misses, cache.evictions) == (2, 4, 2)
+
+    def test_negative_ttl(self):
+        clock = FakeClock()
+        cache = DecodeCache(negative_ttl=0.5, clock=clock)
+        rows = ["0" * 25] * 25
+
+        for _ in range(3):
+            with pytest.raises(ValueError):
+                QrCodeDecoder(rows, cache=cache).decode()
+        assert (cache.hits, cache.misses) == (2, 1)
+
+        # Failures are only cached for a short time
+        clock.now = 0.6
+        with pytest.raises(ValueError):
+            QrCodeDecoder(rows, cache=cache).decode()
+        assert (cache.hits, cache.misses) == (2, 2)
+
+    def test_invalid_size(self):
+        with pytest.raises(ValueError):
+            DecodeCache(max_size=0)
@@ -0,0 +1,101 @@
+import pytest
+
+from qrcode import QRCode
+
+from qr import corpus
+from qr.decoder import decode_many
+
+def generate_qr_files(directory):
+    messages = {}
+    for version in [1, 2, 7, 25]:
+        message = f"Symbol V{version}"
+        qr_code = QRCode(version=version)
+        qr_code.add_data(message)
+        qr_code.make(fit=False)
+
+        filename = directory / f"{version:02d}.qr"
+        with open(filename, "w", encoding="ascii") as file:
+            for row in qr_code.modules:
+                file.write(''.join(str(int(module)) for module in row))
+                file.write('\n')
+        messages[version] = message
+    return messages
+
+class TestCorpus:
+    @pytest.fixture
+    def corpus_file(self, tmp_path):
+        qr_dir = tmp_path / "qr"
+        qr_dir.mkdir()
+        messages = generate_qr_files(qr_dir)
+        path = tmp_path / "corpus.qrc"
+        filenames = corpus.convert_directory(qr_dir, path)
+        assert [filename.name for filename in filenames] == ["01.qr", "02.qr", "07.qr", "25.qr"]
+        return path, list(messages.items())
+
+    def test_random_access(self, corpus_file):
+        path, messages = corpus_file
+        with corpus.CorpusReader(path) as reader:
+            assert len(reader) == len(messages)
+            for idx in [3, 0, 2, 1, -1]:
+                version, message = messages[idx]
+                entry = reader[idx]
+                assert entry.version == version
+                assert entry.size == 17 + 4 * version
+                assert entry.data.readonly
+                assert reader.decoder(idx).decode().text == message
+
+            with pytest.raises(IndexError):
+                reader[len(messages)] # pylint: disable=pointless-statement
+
+    @pytest.mark.parametrize("engine", ['python', 'numpy'])
+    def test_streaming(self, corpus_file, engine):
+        path, messages = corpus_file
+        with corpus.CorpusReader(path) as reader:
+            texts = []
+            for entry in reader:
+                my_qr = corpus.QrCodeDecoder(entry.data, engine, entry.size)
+                texts.append(my_qr.decode().text)
+        assert texts == [message for _, message in messages]
+
+    def test_close_with_live_views(self, corpus_file):
+        path, messages = corpus_file
+        with corpus.CorpusReader(path) as reader:
+            entry = reader[0]
+            my_qr = reader.decoder(1)
+        assert bytes(entry.data)
+        assert my_qr.decode().text == messages[1][1]
+        reader.close()
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_decode_many(self, corpus_file, workers):
+        path, messages = corpus_file
+        with corpus.CorpusReader(path) as reader:
+            items = [(entry.data, entry.size) for entry in reader]
+            # Neither a valid matrix nor picklable: only its own item fails
+            items.insert(1, lambda: None)
+            results = list(decode_many(items, workers=workers, chunksize=2, versions=[1]))
+            del items
+
+        assert [item.index for item in results] == list(range(len(messages) + 1))
+        assert [item.result and item.result.text for item in results] \
+                == [messages[0][1], None] + [message for _, message in messages[1:]]
+        assert results[1].error is not None
+
+    def test_writer_mixed_inputs(self, tmp_path):
+        path = tmp_path / "corpus.qrc"
+        with corpus.CorpusWriter(path) as writer:
+            assert writer.add(["010", "101", "010"]) == 0
+            assert writer.add(b"\xff\x80" * 9, size=9) == 1
+            assert writer.add([0b1] * 21) == 2
+
+        with corpus.CorpusReader(path) as reader:
+            assert [(entry.size, entry.version) for entry in reader] == [(3, 0), (9, 0), (21, 1)]
+            assert bytes(reader[0].data) == b"\x40\xa0\x40"
+            assert bytes(reader[1].data) == b"\xff\x80" * 9
+            assert bytes(reader[2].data) == b"\x00\x00\x08" * 21
+
+    def test_not_a_corpus(self, tmp_path):
+        path = tmp_path / "corpus.qrc"
+        path.write_bytes(b"NOTACORPUS" * 4)
+        with pytest.raises(ValueError):
+            corpus.CorpusReader(path)
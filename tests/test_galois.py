@@ -1,4 +1,7 @@
-from ec.galois import BinaryGaloisField
+import pytest
+
+from ec.galois import BinaryGaloisField, CarrylessBinaryGaloisField
+from ec.galois import TABLES_MEMORY_BUDGET, galois_field
 
 GF8 = BinaryGaloisField(3)
 GF16 = BinaryGaloisField(4)
@@ -91,3 +94,85 @@ class TestBinaryGaloisFieldPoly:
 
     def test_gf_poly_eval(self):
         assert GF256.gf_poly_eval([7, 5, 2, 3], 5) == 203
+
+class TestBinaryGaloisFieldAccelerationTables:
+    def test_tables_gf16(self):
+        assert GF16.exp_table == GF16.log_to_vector * 2
+        assert GF16.inv_table == [0, 1, 9, 14, 13, 11, 7, 6, 15, 2, 12, 5, 10, 4, 3, 8]
+        assert GF16.mul_table[13][14] == 10
+
+    def test_tables_shared(self):
+        assert BinaryGaloisField(8).mul_table is GF256.mul_table
+
+    def test_no_mul_table_for_large_fields(self):
+        gf4096 = BinaryGaloisField(12)
+        assert gf4096.mul_table is None
+        assert gf4096.gf_mul(gf4096.gf_inv(1234), 1234) == 1
+        assert gf4096.gf_mul(0, 1234) == 0
+
+    def test_consistency_gf256(self):
+        for x in range(256):
+            for y in range(256):
+                expected = 0
+                if x and y:
+                    expected = GF256.log_to_vector[
+                            (GF256.vector_to_log[x] + GF256.vector_to_log[y]) % GF256.n]
+                assert GF256.gf_mul(x, y) == expected
+                if y:
+                    assert GF256.gf_mul(GF256.gf_div(x, y), y) == x
+
+class TestBinaryGaloisFieldPolyLog:
+    def test_gf_poly_scale_log(self):
+        assert GF256.gf_poly_scale_log([200, 142, 13, 0, 28, 245, 4, 74],
+                GF256.vector_to_log[23]) == [94, 133, 243, 0, 137, 26, 92, 63]
+
+    def test_gf_poly_eval_log(self):
+        assert GF256.gf_poly_eval_log([7, 5, 2, 3], GF256.vector_to_log[5]) == 203
+        assert GF256.gf_poly_eval_log([7, 0, 0], 0) == 7
+
+    def test_gf_poly_mul(self):
+        gf4096 = BinaryGaloisField(12)
+        for gf in (GF256, gf4096):
+            assert gf.gf_poly_mul([3, 0, 1], [1, 1]) == [3, 3, 1, 1]
+            assert gf.gf_poly_mul([0, 0, 0], [5, 7]) == [0, 0, 0, 0]
+
+class TestCarrylessBinaryGaloisField:
+    def test_same_as_tables(self):
+        for m in (3, 4, 8, 12):
+            gf, gf_carryless = BinaryGaloisField(m), CarrylessBinaryGaloisField(m)
+            values = range(0, 2**m, max(1, 2**m // 64))
+            for x in values:
+                for y in values:
+                    assert gf_carryless.gf_mul(x, y) == gf.gf_mul(x, y)
+                    if y:
+                        assert gf_carryless.gf_div(x, y) == gf.gf_div(x, y)
+                if x:
+                    assert gf_carryless.gf_inv(x) == gf.gf_inv(x)
+                    assert gf_carryless.gf_log(x) == gf.gf_log(x)
+                for power in (0, 1, 25, 2**m):
+                    assert gf_carryless.gf_pow(x, power) == gf.gf_pow(x, power)
+
+            poly = list(range(1, 2**m, 2**m // 7))
+            assert gf_carryless.gf_poly_eval(poly, 3) == gf.gf_poly_eval(poly, 3)
+            assert gf_carryless.gf_poly_mul(poly, [3, 0, 1]) == gf.gf_poly_mul(poly, [3, 0, 1])
+
+    def test_primitive_polys(self):
+        # alpha generates the whole multiplicative group
+        for m in range(13, 17):
+            gf = CarrylessBinaryGaloisField(m)
+            assert gf.gf_exp(gf.n) == 1
+            for prime in {2, 3, 5, 7, 17, 31, 43, 73, 127, 151, 257, 8191}:
+                if not gf.n % prime:
+                    assert gf.gf_exp(gf.n // prime) != 1
+
+    def test_field_selection(self):
+        assert type(galois_field(8)) is BinaryGaloisField
+        assert type(galois_field(16)) is CarrylessBinaryGaloisField
+        assert type(galois_field(8, memory_budget=0)) is CarrylessBinaryGaloisField
+        assert BinaryGaloisField.tables_memory(16) > TABLES_MEMORY_BUDGET
+
+    def test_limits(self):
+        with pytest.raises(ValueError):
+            CarrylessBinaryGaloisField(17)
+        with pytest.raises(ValueError):
+            galois_field(2)
@@ -0,0 +1,100 @@
+import random
+
+import pytest
+
+from ec.galois import BinaryGaloisField
+from ec.galois_array import BinaryGaloisFieldArray
+
+np = pytest.importorskip("numpy")
+
+M_VALUES = [3, 4, 8, 12]
+
+def operands(m, count=3000):
+    """All the pairs of elements for the small fields, random ones for the larger ones"""
+
+    size = 2**m
+    if size * size <= count:
+        x, y = np.meshgrid(np.arange(size), np.arange(size))
+        return x.ravel(), y.ravel()
+
+    rng = np.random.default_rng(m)
+    x, y = rng.integers(0, size, count), rng.integers(0, size, count)
+    # Make sure zeroes are covered
+    x[:10] = 0
+    y[5:15] = 0
+    return x, y
+
+class TestElementWise:
+    @pytest.mark.parametrize("m", M_VALUES)
+    def test_mul(self, m):
+        gf, gfa = BinaryGaloisField(m), BinaryGaloisFieldArray(m)
+        x, y = operands(m)
+        assert gfa.mul(x, y).tolist() == [gf.gf_mul(a, b) for a, b in zip(x.tolist(), y.tolist())]
+
+    @pytest.mark.parametrize("m", M_VALUES)
+    def test_div(self, m):
+        gf, gfa = BinaryGaloisField(m), BinaryGaloisFieldArray(m)
+        x, y = operands(m)
+        x, y = x[y != 0], y[y != 0]
+        assert gfa.div(x, y).tolist() == [gf.gf_div(a, b) for a, b in zip(x.tolist(), y.tolist())]
+
+        with pytest.raises(ZeroDivisionError):
+            gfa.div([1, 2], [1, 0])
+
+    @pytest.mark.parametrize("m", M_VALUES)
+    def test_inv(self, m):
+        gf, gfa = BinaryGaloisField(m), BinaryGaloisFieldArray(m)
+        x = np.arange(1, 2**m)
+        assert gfa.inv(x).tolist() == [gf.gf_inv(a) for a in x.tolist()]
+
+        with pytest.raises(ZeroDivisionError):
+            gfa.inv([0, 1])
+
+    @pytest.mark.parametrize("m", M_VALUES)
+    def test_pow(self, m):
+        gf, gfa = BinaryGaloisField(m), BinaryGaloisFieldArray(m)
+        x = np.arange(2**m)
+        for power in [0, 1, 2, 25, 510, 2**m]:
+            assert gfa.pow(x, power).tolist() == [gf.gf_pow(a, power) for a in x.tolist()]
+
+        powers = np.arange(2**m)
+        assert gfa.pow(x, powers).tolist() \
+                == [gf.gf_pow(a, b) for a, b in zip(x.tolist(), powers.tolist())]
+
+    def test_broadcast(self):
+        gfa = BinaryGaloisFieldArray(8)
+        assert gfa.mul([[1], [2]], [3, 4, 5]).shape == (2, 3)
+        assert gfa.mul(137, 42) == 195
+
+class TestPoly:
+    @pytest.mark.parametrize("m", M_VALUES)
+    def test_poly_eval(self, m):
+        gf, gfa = BinaryGaloisField(m), BinaryGaloisFieldArray(m)
+        rng = random.Random(m)
+        polys = [[rng.randrange(2**m) for _ in range(9)] for _ in range(5)]
+        polys[1][-1] = 0
+        xs = list(range(2**m))
+
+        res = gfa.poly_eval(polys, xs)
+        assert res.shape == (5, 2**m)
+        assert res.tolist() == [[gf.gf_poly_eval(poly, x) for x in xs] for poly in polys]
+
+    def test_poly_eval_scalar(self):
+        gfa = BinaryGaloisFieldArray(8)
+        assert gfa.poly_eval([7, 5, 2, 3], 5) == 203
+        assert gfa.poly_eval([7], [0, 1, 2]).tolist() == [7, 7, 7]
+
+    @pytest.mark.parametrize("m", M_VALUES)
+    def test_poly_mul(self, m):
+        gf, gfa = BinaryGaloisField(m), BinaryGaloisFieldArray(m)
+        rng = random.Random(m)
+        polys1 = [[rng.randrange(2**m) for _ in range(6)] for _ in range(4)]
+        polys2 = [[rng.randrange(2**m) for _ in range(3)] for _ in range(4)]
+
+        res = gfa.poly_mul(polys1, polys2)
+        assert res.tolist() == [gf.gf_poly_mul(poly1, poly2) \
+                for poly1, poly2 in zip(polys1, polys2)]
+
+        # A polynomial times many others
+        res = gfa.poly_mul(polys1[0], polys2)
+        assert res.tolist() == [gf.gf_poly_mul(polys1[0], poly2) for poly2 in polys2]
@@ -0,0 +1,80 @@
+import pytest
+
+from qrcode import QRCode
+
+from qr import decoder
+from qr.decoder import QrCodeDecoder
+from qr.profiling import DecodeObserver, StageProfiler
+
+STAGES = ['load', 'format', 'unfold', 'unmask', 'deinterlace', 'correct', 'parse']
+
+class EventRecorder(DecodeObserver):
+    def __init__(self):
+        self.events = []
+
+    def stage_start(self, stage, timestamp_ns):
+        self.events.append(('start', stage, timestamp_ns))
+
+    def stage_end(self, stage, timestamp_ns, counters):
+        self.events.append(('end', stage, timestamp_ns, counters))
+
+@pytest.fixture(name="rows")
+def fixture_rows():
+    qr_code = QRCode(version=7)
+    qr_code.add_data("Observed")
+    qr_code.add_data("12345")
+    qr_code.make(fit=False)
+    return [''.join(str(int(module)) for module in row) for row in qr_code.modules]
+
+class TestObserver:
+    @pytest.mark.parametrize("engine", ["python", "numpy"])
+    def test_events(self, rows, engine):
+        recorder = EventRecorder()
+        assert QrCodeDecoder(rows, engine, observer=recorder).decode().text == "Observed12345"
+
+        events = recorder.events
+        assert [event[:2] for event in events] \
+                == [(kind, stage) for stage in STAGES for kind in ('start', 'end')]
+        timestamps = [event[2] for event in events]
+        assert timestamps == sorted(timestamps)
+
+        counters = {event[1]: event[3] for event in events if event[0] == 'end'}
+        assert counters == {
+            'load': {'modules': 45 * 45},
+            'format': {'modules': 2 * 15 + 2 * 18},
+            'unfold': {'modules': 8 * 196},
+            'unmask': {'codewords': 196},
+            'deinterlace': {'blocks': 4},
+            'correct': {'errors_corrected': 0},
+            'parse': {'segments': 2, 'bytes': 13},
+        }
+
+    def test_early_exit(self, rows):
+        recorder = EventRecorder()
+        for _ in QrCodeDecoder(rows, observer=recorder).iter_segments():
+            break
+        assert recorder.events[-1][:2] == ('end', 'parse')
+        assert recorder.events[-1][3] == {'segments': 1, 'bytes': 8}
+
+    def test_failed_stage(self):
+        recorder = EventRecorder()
+        with pytest.raises(ValueError):
+            QrCodeDecoder(["0" * 21] * 21, observer=recorder).decode()
+        assert [event[:2] for event in recorder.events] \
+                == [('start', 'load'), ('end', 'load'), ('start', 'format')]
+
+    def test_no_observer(self, rows, monkeypatch):
+        # No timestamp is taken without an observer
+        monkeypatch.setattr(decoder, "perf_counter_ns", None)
+        assert QrCodeDecoder(rows).decode().text == "Observed12345"
+
+    def test_profiler(self, rows):
+        profiler = StageProfiler()
+        for _ in range(3):
+            QrCodeDecoder(rows, observer=profiler).decode()
+
+        assert list(profiler.calls) == STAGES
+        assert all(calls == 3 for calls in profiler.calls.values())
+        assert profiler.counters['parse'] == {'segments': 6, 'bytes': 39}
+        assert not profiler.starts
+        assert len(profiler.report().splitlines()) == len(STAGES)
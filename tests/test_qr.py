@@ -1,13 +1,83 @@
 from os.path import exists
 from os import makedirs
-from io import StringIO
 
 import pytest
 
 from qrcode import QRCode
+from qrcode.util import QRData, MODE_NUMBER, MODE_ALPHA_NUM, MODE_8BIT_BYTE
 from qrcode.constants import ERROR_CORRECT_L, ERROR_CORRECT_M, ERROR_CORRECT_Q, ERROR_CORRECT_H
 
-from qr.decoder import QrCodeDecoder
+from qr.bitstream import BitReader
+from qr.decoder import QrCodeDecoder, decode_many, warm_up
+from qr import consts, engines, layout
+
+class TestBitReader:
+    def test_read_bits(self):
+        bitstream = BitReader(bytes([0b10110011, 0b01011100, 0b11110000]))
+        assert bitstream.remaining() == 24
+        assert bitstream.read_bits(3) == 0b101
+        assert bitstream.read_bits(10) == 0b1001101011
+        assert bitstream.read_bits(0) == 0
+        assert bitstream.read_bits(11) == 0b10011110000
+        assert bitstream.remaining() == 0
+
+    def test_peek_bits(self):
+        bitstream = BitReader.from_bitstring("0011" + "101")
+        assert bitstream.peek_bits(4) == 0b0011
+        assert bitstream.read_bits(4) == 0b0011
+        assert bitstream.peek_bits(3) == 0b101
+        with pytest.raises(ValueError):
+            bitstream.peek_bits(4)
+        assert bitstream.remaining() == 3
+
+    def test_read_bytes(self):
+        bitstream = BitReader.from_bitstring("1010" + "0100100001101001" + "1100")
+        assert bitstream.read_bits(4) == 0b1010
+        assert bitstream.read_bytes(2) == b"Hi"
+        assert bitstream.remaining() == 4
+
+    def test_exhaustion(self):
+        bitstream = BitReader.from_bitstring("101")
+        with pytest.raises(ValueError):
+            bitstream.read_bits(4)
+        with pytest.raises(ValueError):
+            bitstream.read_bytes(1)
+        assert bitstream.read_bits(3) == 0b101
+
+class TestLayout:
+    # Number of remainder bits of each version (Table 1)
+    REMAINDER_BITS = [None, 0] + [7] * 5 + [0] * 7 + [3] * 7 + [4] * 7 + [3] * 7 + [0] * 6
+
+    @pytest.mark.parametrize("version", list(range(1, 41)))
+    def test_codewords_count(self, version):
+        version_layout = layout.get_layout(version)
+        assert version_layout.size == 17 + 4 * version
+        assert len(version_layout.data_modules) == \
+                8 * version_layout.nb_codewords + self.REMAINDER_BITS[version]
+
+        for ec_config, blocks in zip(consts.EC_BLOCKS[version], version_layout.blocks):
+            assert sum(nb_blocks * nb_words for nb_blocks, (nb_words, _, _) in ec_config) \
+                    == version_layout.nb_codewords
+            indexes = [idx for data_idx, error_idx in blocks for idx in data_idx + error_idx]
+            assert sorted(indexes) == list(range(version_layout.nb_codewords))
+
+    def test_cached(self):
+        assert layout.get_layout(7) is layout.get_layout(7)
+
+    @pytest.mark.parametrize("mask_pattern", list(range(8)))
+    def test_data_mask(self, mask_pattern):
+        version_layout = layout.get_layout(7)
+        data_mask = layout.get_data_mask(7, mask_pattern)
+        nb_bits = 8 * version_layout.nb_codewords
+
+        for bit_idx, (row, col) in enumerate(version_layout.data_modules[:nb_bits]):
+            expected = consts.FORMAT_MASK_PATTERNS[mask_pattern](row, col)
+            assert (data_mask >> (nb_bits - 1 - bit_idx)) & 1 == expected
+
+    @pytest.mark.parametrize("version", [0, 41])
+    def test_invalid_version(self, version):
+        with pytest.raises(ValueError):
+            layout.get_layout(version)
 
 class TestParseEciDesignator:
     @pytest.mark.parametrize(("expected", "bitstring"),
@@ -20,11 +90,8 @@ class TestParseEciDesignator:
         ],
         ids = ["3_8bit", "3_16bit", "3_24bit", "30_8bit", "30_16bit", "30_24bit"])
     def test_designator_valid(self, expected, bitstring):
-        bitstream = StringIO(bitstring)
-        try:
-            assert QrCodeDecoder._parse_eci_designator(bitstream) == expected
-        finally:
-            bitstream.close()
+        bitstream = BitReader.from_bitstring(bitstring)
+        assert QrCodeDecoder._parse_eci_designator(bitstream) == expected
 
     @pytest.mark.parametrize(("expected", "bitstring"),
         [   (3, "10000011"),
@@ -63,11 +130,8 @@ class TestDecodeNumericSegment:
     def test_numeric_valid(self, expected, bitstring, char_count=None):
         if char_count is None:
             char_count = len(expected)
-        bitstream = StringIO(bitstring)
-        try:
-            assert QrCodeDecoder._decode_numeric_segment(bitstream, char_count) == expected
-        finally:
-            bitstream.close()
+        bitstream = BitReader.from_bitstring(bitstring)
+        assert QrCodeDecoder._decode_numeric_segment(bitstream, char_count) == expected
 
     @pytest.mark.parametrize(("expected", "bitstring", "char_count"),
         [   ("145",  "001001001", None),
@@ -106,11 +170,8 @@ class TestDecodeAlphaNumericSegment:
     def test_alphanumeric_valid(self, expected, bitstring, char_count=None):
         if char_count is None:
             char_count = len(expected)
-        bitstream = StringIO(bitstring)
-        try:
-            assert QrCodeDecoder._decode_alphanumeric_segment(bitstream, char_count) == expected
-        finally:
-            bitstream.close()
+        bitstream = BitReader.from_bitstring(bitstring)
+        assert QrCodeDecoder._decode_alphanumeric_segment(bitstream, char_count) == expected
 
     @pytest.mark.parametrize(("expected", "bitstring", "char_count"),
         [   (b"O1",  "1000011101", None),
@@ -141,11 +202,8 @@ class TestDecodeEightBitSegment:
             char_count = len(expected)
         if bitstring is None:
             bitstring = ''.join([format(byte, '08b') for byte in expected])
-        bitstream = StringIO(bitstring)
-        try:
-            assert QrCodeDecoder._decode_eightbitbyte_segment(bitstream, char_count) == expected
-        finally:
-            bitstream.close()
+        bitstream = BitReader.from_bitstring(bitstring)
+        assert QrCodeDecoder._decode_eightbitbyte_segment(bitstream, char_count) == expected
 
     @pytest.mark.parametrize(("expected", "bitstring", "char_count"),
         [   (b"H", "1010110", None),
@@ -159,10 +217,180 @@ class TestDecodeEightBitSegment:
             self.test_eightbit_valid(expected, bitstring, char_count)
 
 
+class TestDecodeKanjiSegment:
+    @staticmethod
+    def kanji_bitstring(text):
+        sjis = text.encode('shift-jis')
+        bitstring = ""
+        for i in range(0, len(sjis), 2):
+            double_byte = int.from_bytes(sjis[i:i + 2], 'big')
+            double_byte -= 0x8140 if double_byte < 0xe040 else 0xc140
+            bitstring += format((double_byte >> 8) * 0xc0 + (double_byte & 0xff), '013b')
+        return bitstring
+
+    @pytest.mark.parametrize(("expected", "bitstring"),
+        [   ("点茗", "0110110011111" + "1101010101010"),
+            ("品質検査ラベル", None),
+            ("", "")],
+        ids = ["spec_example", "label", "empty"])
+    def test_kanji_valid(self, expected, bitstring):
+        if bitstring is None:
+            bitstring = self.kanji_bitstring(expected)
+        bitstream = BitReader.from_bitstring(bitstring)
+        seg_data = QrCodeDecoder._decode_kanji_segment(bitstream, len(expected))
+        assert seg_data == expected.encode('shift-jis')
+        assert seg_data.decode('shift-jis') == expected
+
+    @pytest.mark.parametrize(("bitstring", "char_count"),
+        [   ("0110110011111" + "110101010101", 2),
+            ("0110110011111", 1031)],
+        ids = ["bitstream_overflow", "bitstream_overflow_crazy"])
+    def test_kanji_invalid(self, bitstring, char_count):
+        bitstream = BitReader.from_bitstring(bitstring)
+        with pytest.raises(ValueError):
+            QrCodeDecoder._decode_kanji_segment(bitstream, char_count)
+
+    def test_kanji_table(self):
+        table = consts.kanji_table()
+        assert len(table) == 1 << consts.KANJI_BIT_LEN
+        assert table[0] == b"\x81\x40"
+        assert table[0x0d9f] == b"\x93\x5f"
+        assert table[0x1aaa] == b"\xe4\xaa"
+        assert consts.kanji_table() is table
+
+
+class TestDecodeFormat:
+    A = consts.FORMAT_INFO[0b01101]
+    B = consts.FORMAT_INFO[0b10010]
+
+    @pytest.mark.parametrize(("expected", "nw_format", "swne_format"),
+        [   ((0b01, 0b101, True), A, A),
+            ((0b01, 0b101, True), A ^ 0b111, A ^ 0b111 << 12),
+            ((0b01, 0b101, False), A ^ 0b1111, A ^ 0b11),
+            ((0b01, 0b101, False), A, A ^ 0b1111111),
+            # The copies disagree: the nearest format to both copies wins
+            ((0b10, 0b010, False), A ^ 0b1, B),
+            ((0b01, 0b101, False), A ^ 0b1, B ^ 0b1 << 14 ^ 0b11)],
+        ids = ["exact", "3_errors_each", "nw_unrecoverable", "swne_unrecoverable",
+            "disagree_swne_nearest", "disagree_nw_nearest"])
+    def test_format_valid(self, expected, nw_format, swne_format, monkeypatch):
+        decoder = QrCodeDecoder(["0" * 21] * 21)
+        monkeypatch.setattr(decoder, "_unfold_formats", lambda: [nw_format, swne_format])
+        assert decoder._decode_format() == expected
+
+    def test_format_invalid(self, monkeypatch):
+        decoder = QrCodeDecoder(["0" * 21] * 21)
+        monkeypatch.setattr(decoder, "_unfold_formats",
+                lambda: [self.A ^ 0b1111, self.A ^ 0b1111 << 11])
+        with pytest.raises(ValueError):
+            decoder._decode_format()
+
+    def test_format_table(self):
+        for format_data, codeword in enumerate(consts.FORMAT_INFO):
+            format_ = codeword ^ consts.FORMAT_MASK_PATTERN
+            assert consts.BCH_FORMAT.decode(format_) == (0, format_)
+            assert format_ >> consts.FORMAT_EC_BIT_LEN == format_data
+            assert consts.BCH_FORMAT.encode(format_data) == format_
+
+    def test_version_table(self):
+        for version, codeword in enumerate(consts.VERSION_INFO):
+            if codeword is not None:
+                assert consts.BCH_VERSION.encode(version) == codeword
+
+
+class TestEngines:
+    @pytest.mark.parametrize("engine", ['python', 'numpy'])
+    @pytest.mark.parametrize(("rows"),
+        [   ["01", "10", "11"],
+            ["012", "101", "110"],
+            ["0a1", "101", "110"]],
+        ids = ["not_square", "not_binary", "not_digit"])
+    def test_load_invalid(self, engine, rows):
+        with pytest.raises(ValueError):
+            QrCodeDecoder(rows, engine=engine)
+
+    @pytest.mark.parametrize("engine", ['python', 'numpy'])
+    @pytest.mark.parametrize(("qr_code", "size"),
+        [   (b"\x00\x00", None),
+            (b"\x00\x00\x00", 2),
+            ([0b01, 0b10, 0b1111], None),
+            ([0b01, -1, 0b11], None),
+            (["01", "10"], 3)],
+        ids = ["packed_no_size", "packed_bad_length", "row_int_overflow", "row_int_negative",
+            "size_mismatch"])
+    def test_load_invalid_inputs(self, engine, qr_code, size):
+        with pytest.raises(ValueError):
+            QrCodeDecoder(qr_code, engine=engine, size=size)
+
+    @pytest.mark.parametrize("engine", ['python', 'numpy'])
+    @pytest.mark.parametrize(("shape", "value", "dtype"),
+        [   ((3, 2), 0, "uint8"),
+            ((2, 2), 2, "int64"),
+            ((21, 21), 1.0, "float64")],
+        ids = ["not_square", "not_binary", "float"])
+    def test_load_invalid_ndarray(self, engine, shape, value, dtype):
+        np = pytest.importorskip("numpy")
+        with pytest.raises(ValueError):
+            QrCodeDecoder(np.full(shape, value, dtype=dtype), engine=engine)
+
+    def test_unknown_engine(self):
+        with pytest.raises(ValueError):
+            QrCodeDecoder(["1"], engine="fortran")
+
+    def test_numpy_fallback(self, monkeypatch):
+        monkeypatch.setattr(engines, "np", None)
+        assert engines.get_engine('numpy') is engines.PythonEngine
+
+
+class TestDecodeDataSegments:
+    ECI_UTF8 = "0111" + "00011010"
+
+    def test_eci_character_split_over_segments(self):
+        # "é" in UTF-8 (0xc3 0xa9), over two 8-bit segments
+        bitstream = BitReader.from_bitstring(self.ECI_UTF8 \
+                + "0100" + "00000001" + "11000011" \
+                + "0100" + "00000001" + "10101001" + "0000")
+
+        segments = list(QrCodeDecoder._decode_data_blocks_segments(bitstream, 1))
+        assert [(segment.eci, segment.bit_offset, segment.data, segment.text) \
+                for segment in segments] == [(26, 12, b"\xc3", ""), (26, 32, b"\xa9", "\u00e9")]
+
+    @pytest.mark.parametrize(("bitstring"),
+        [   ECI_UTF8 + "0100" + "00000001" + "11000011" + "0000",
+            ECI_UTF8 + "0100" + "00000001" + "11000011" + "0111" + "00000011"],
+        ids = ["at_end", "at_eci_switch"])
+    def test_eci_partial_character(self, bitstring):
+        bitstream = BitReader.from_bitstring(bitstring)
+        with pytest.raises(ValueError):
+            list(QrCodeDecoder._decode_data_blocks_segments(bitstream, 1))
+
+    def test_kanji_segment(self):
+        # Kanji segments are Shift JIS, even after an ECI switch
+        bitstream = BitReader.from_bitstring(self.ECI_UTF8 \
+                + "1000" + "00000010" + "0110110011111" + "1101010101010" \
+                + "0100" + "00000001" + "01000001" + "0000")
+
+        segments = list(QrCodeDecoder._decode_data_blocks_segments(bitstream, 1))
+        assert [(segment.mode, segment.char_count, segment.text) for segment in segments] == [
+                (consts.DataModeIndicator.KANJI, 2, "点茗"),
+                (consts.DataModeIndicator.EIGHTBITBYTE, 1, "A")]
+
+    def test_kanji_invalid_character(self):
+        bitstream = BitReader.from_bitstring("1000" + "00000001" + "1111111111111" + "0000")
+        with pytest.raises(ValueError):
+            list(QrCodeDecoder._decode_data_blocks_segments(bitstream, 1))
+
+    def test_implied_terminator(self):
+        bitstream = BitReader.from_bitstring("0001" + "0000000011" + "0000001100" + "101")
+        [segment] = QrCodeDecoder._decode_data_blocks_segments(bitstream, 1)
+        assert segment.text == "012"
+
+
 class TestDecode:
     EC_STR = ['L', 'M', 'Q', 'H']
     EC_DICT = {val: idx for idx, val in enumerate(EC_STR)}
     EC_QR = [ERROR_CORRECT_L, ERROR_CORRECT_M, ERROR_CORRECT_Q, ERROR_CORRECT_H]
+    ENGINES = ['python', 'numpy']
 
 
     @pytest.fixture(scope="class", autouse=True)
@@ -191,9 +419,7 @@ class TestDecode:
             2809, 2213, 1579, 1219, 2953, 2331, 1663, 1273
         ]
 
-    @pytest.mark.parametrize("ec_str", EC_STR)
-    @pytest.mark.parametrize("version", list(range(1, 41)))
-    def test_decode_all_versions_with_8bit_max_size(self, lorem, eightbit_capa, version, ec_str):
+    def qr_file(self, lorem, eightbit_capa, version, ec_str):
         ecl = self.EC_DICT[ec_str]
         capacity_idx = 4 * (version - 1) + ecl
         data = lorem[:eightbit_capa[capacity_idx]]
@@ -218,6 +444,282 @@ class TestDecode:
                     file.write(''.join(str(int(module)) for module in row))
                     file.write('\n')
 
+        return filename, data
+
+    @pytest.mark.parametrize("engine", ENGINES)
+    @pytest.mark.parametrize("ec_str", EC_STR)
+    @pytest.mark.parametrize("version", list(range(1, 41)))
+    def test_decode_all_versions_with_8bit_max_size(self, lorem, eightbit_capa, version, ec_str,
+            engine):
+        filename, data = self.qr_file(lorem, eightbit_capa, version, ec_str)
+
         # Load reference QR Code from disk and check if we can retrieve the correct data
-        my_qr = QrCodeDecoder(filename)
-        assert my_qr.decode() == data
+        my_qr = QrCodeDecoder(filename, engine=engine)
+        assert my_qr.decode().text == data
+
+    @pytest.mark.parametrize("engine", ENGINES)
+    @pytest.mark.parametrize("kind", ["bytes", "bytearray", "memoryview", "ndarray", "row_ints",
+        "module_lists"])
+    @pytest.mark.parametrize("version", [1, 4, 13, 40])
+    def test_decode_input_kinds(self, lorem, eightbit_capa, version, kind, engine):
+        np = pytest.importorskip("numpy")
+        filename, data = self.qr_file(lorem, eightbit_capa, version, 'M')
+        with open(filename, 'r', encoding="ascii") as file:
+            rows = [row.strip() for row in file]
+        size = len(rows)
+
+        modules = np.array([[int(module) for module in row] for row in rows], dtype=np.uint8)
+        packed = np.packbits(modules, axis=1).tobytes()
+        qr_code = {
+            "bytes": packed,
+            "bytearray": bytearray(packed),
+            "memoryview": memoryview(packed),
+            "ndarray": modules,
+            "row_ints": [int(row, 2) for row in rows],
+            "module_lists": modules.tolist(),
+        }[kind]
+
+        my_qr = QrCodeDecoder(qr_code, engine=engine, size=size)
+        assert my_qr.size == size
+        assert my_qr.decode().text == data
+
+    @pytest.mark.parametrize("ec_str", EC_STR)
+    @pytest.mark.parametrize("version", [2, 11, 33])
+    def test_probe(self, lorem, eightbit_capa, version, ec_str):
+        filename, _ = self.qr_file(lorem, eightbit_capa, version, ec_str)
+        with open(filename, 'r', encoding="ascii") as file:
+            rows = [row.strip() for row in file]
+        expected = (version, consts.EC_LEVEL.index(ec_str), (self.EC_DICT[ec_str] + version) % 8)
+        version_info = version if version >= 7 else None
+
+        my_qr = QrCodeDecoder(rows)
+        assert my_qr.probe() == expected + (True, version_info)
+        assert my_qr.layout is None
+
+        # Damage the NW format copy beyond repair: SWNE copy is used alone
+        flipped = ''.join('0' if module == '1' else '1' for module in rows[8][:4])
+        rows[8] = flipped + rows[8][4:]
+        assert QrCodeDecoder(rows).probe() == expected + (False, version_info)
+
+    @staticmethod
+    def write_version_info(rows, version_info, block):
+        size = len(rows)
+        for i in range(18):
+            row, col = i // 3, size - 11 + i % 3
+            if block == 'SW':
+                row, col = col, row
+            rows[row][col] = str((version_info >> i) & 1)
+
+    @pytest.mark.parametrize("version", [7, 24, 40])
+    def test_version_info(self, lorem, eightbit_capa, version):
+        filename, data = self.qr_file(lorem, eightbit_capa, version, 'L')
+        with open(filename, 'r', encoding="ascii") as file:
+            rows = [list(row.strip()) for row in file]
+
+        def decoder():
+            return QrCodeDecoder([''.join(row) for row in rows])
+
+        # Up to 3 errors are corrected in each block
+        codeword = consts.VERSION_INFO[version]
+        self.write_version_info(rows, codeword ^ 0b100000001000000001, 'NE')
+        self.write_version_info(rows, codeword ^ 0b111, 'SW')
+        assert decoder().probe().version_info == version
+        assert decoder().decode().version_info == version
+
+        # One readable block is enough
+        self.write_version_info(rows, codeword ^ 0b1111, 'SW')
+        assert decoder().probe().version_info == version
+
+        # Both blocks are damaged beyond repair
+        self.write_version_info(rows, codeword ^ 0b1111, 'NE')
+        with pytest.raises(ValueError, match="non-recoverable"):
+            decoder().probe()
+
+        # The blocks read another version than the one of the matrix size
+        other = consts.VERSION_INFO[version - 1 if version > 7 else version + 1]
+        self.write_version_info(rows, other, 'NE')
+        self.write_version_info(rows, other, 'SW')
+        with pytest.raises(ValueError, match="doesn't match"):
+            decoder().probe()
+
+    @pytest.mark.parametrize("size", [17, 22, 181])
+    def test_probe_invalid_size(self, size):
+        with pytest.raises(ValueError):
+            QrCodeDecoder(["0" * size] * size).probe()
+
+    @pytest.mark.parametrize("ec_str", EC_STR)
+    @pytest.mark.parametrize("version", [1, 9, 27])
+    def test_decode_result(self, lorem, eightbit_capa, version, ec_str, capsys):
+        filename, data = self.qr_file(lorem, eightbit_capa, version, ec_str)
+
+        result = QrCodeDecoder(filename).decode()
+        assert result.text == data
+        assert result.data == data.encode('ascii')
+        assert result.version == version
+        assert consts.EC_LEVEL[result.ec_level] == ec_str
+        assert result.mask_pattern == (self.EC_DICT[ec_str] + version) % 8
+        assert result.corrections == [0] * len(result.corrections)
+        assert result.version_info == (version if version >= 7 else None)
+
+        [segment] = result.segments
+        assert segment.mode == consts.DataModeIndicator.EIGHTBITBYTE
+        assert segment.char_count == len(data)
+        assert segment.bit_offset == 0
+        assert segment.eci == consts.Eci.DEFAULT_CHARSET
+        assert segment.data == result.data
+
+        # Decoding is silent
+        assert capsys.readouterr() == ("", "")
+
+    @pytest.mark.parametrize("engine", ENGINES)
+    @pytest.mark.parametrize("ec_str", EC_STR)
+    @pytest.mark.parametrize("version", [1, 5, 7, 21])
+    def test_decode_with_errors(self, lorem, eightbit_capa, version, ec_str, engine):
+        filename, data = self.qr_file(lorem, eightbit_capa, version, ec_str)
+        with open(filename, 'r', encoding="ascii") as file:
+            rows = [list(row.strip()) for row in file]
+
+        # Flip the 8 modules of the first codeword (bottom right corner)
+        for row in (-1, -2, -3, -4):
+            for col in (-1, -2):
+                rows[row][col] = '1' if rows[row][col] == '0' else '0'
+
+        my_qr = QrCodeDecoder([''.join(row) for row in rows], engine=engine)
+        assert my_qr.decode().text == data
+        assert my_qr.corrections[0] == 1
+        assert sum(my_qr.corrections) == 1
+
+    @pytest.mark.parametrize("engine", ENGINES)
+    @pytest.mark.parametrize("ec_str", EC_STR)
+    @pytest.mark.parametrize("version", [1, 8, 25])
+    def test_recover_format(self, lorem, eightbit_capa, version, ec_str, engine):
+        filename, data = self.qr_file(lorem, eightbit_capa, version, ec_str)
+        with open(filename, 'r', encoding="ascii") as file:
+            rows = [list(row.strip()) for row in file]
+
+        # Damage both format copies beyond repair, and the first codeword
+        for row, col in [(8, 0), (8, 1), (8, 2), (8, 3), (-1, 8), (-2, 8), (-3, 8), (-4, 8),
+                (-1, -1), (-1, -2)]:
+            rows[row][col] = '1' if rows[row][col] == '0' else '0'
+        rows = [''.join(row) for row in rows]
+
+        with pytest.raises(ValueError, match="non-recoverable"):
+            QrCodeDecoder(rows, engine=engine).probe()
+
+        my_qr = QrCodeDecoder(rows, engine=engine, recover_format=True)
+        info = my_qr.probe()
+        assert consts.EC_LEVEL[info.ec_level] == ec_str
+        assert info.mask_pattern == (self.EC_DICT[ec_str] + version) % 8
+        assert not info.formats_agree
+        assert my_qr.decode().text == data
+        assert sum(my_qr.corrections) == 1
+
+    @pytest.mark.parametrize("engine", ENGINES)
+    @pytest.mark.parametrize(("version", "ec_str", "nb_errors"),
+            [(1, 'L', 2), (2, 'Q', 6), (2, 'H', 10), (8, 'H', 20), (25, 'M', 40)])
+    def test_recover_format_spread_errors(self, lorem, eightbit_capa, version, ec_str,
+            nb_errors, engine):
+        filename, data = self.qr_file(lorem, eightbit_capa, version, ec_str)
+        with open(filename, 'r', encoding="ascii") as file:
+            rows = [list(row.strip()) for row in file]
+
+        # Damage both format copies beyond repair, and codewords spread over the symbol:
+        # the lower EC levels see fewer errors, but more than they can correct
+        version_layout = layout.get_layout(version)
+        step = version_layout.nb_codewords // nb_errors
+        damaged = [(8, 0), (8, 1), (8, 2), (8, 3), (-1, 8), (-2, 8), (-3, 8), (-4, 8)] \
+                + [version_layout.data_modules[8 * step * i] for i in range(nb_errors)]
+        for row, col in damaged:
+            rows[row][col] = '1' if rows[row][col] == '0' else '0'
+
+        my_qr = QrCodeDecoder([''.join(row) for row in rows], engine=engine,
+                recover_format=True)
+        info = my_qr.probe()
+        assert consts.EC_LEVEL[info.ec_level] == ec_str
+        assert info.mask_pattern == (self.EC_DICT[ec_str] + version) % 8
+        assert my_qr.decode().text == data
+        assert sum(my_qr.corrections) == nb_errors
+
+    @pytest.mark.parametrize("engine", ENGINES)
+    def test_recover_format_unrecoverable(self, lorem, eightbit_capa, engine):
+        filename, _ = self.qr_file(lorem, eightbit_capa, 1, 'H')
+        with open(filename, 'r', encoding="ascii") as file:
+            rows = [list(row.strip()) for row in file]
+
+        # No candidate can correct a symbol whose every codeword is damaged
+        version_layout = layout.get_layout(1)
+        damaged = [(8, 0), (8, 1), (8, 2), (8, 3), (-1, 8), (-2, 8), (-3, 8), (-4, 8)] \
+                + [version_layout.data_modules[8 * i] for i in range(version_layout.nb_codewords)]
+        for row, col in damaged:
+            rows[row][col] = '1' if rows[row][col] == '0' else '0'
+
+        my_qr = QrCodeDecoder([''.join(row) for row in rows], engine=engine,
+                recover_format=True)
+        with pytest.raises(ValueError, match="non-recoverable"):
+            my_qr.probe()
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    @pytest.mark.parametrize("ordered", [True, False])
+    def test_decode_many(self, lorem, eightbit_capa, workers, ordered):
+        inputs = []
+        expected = []
+        for version, ec_str in [(1, 'L'), (3, 'H'), (10, 'Q'), (40, 'M')]:
+            filename, data = self.qr_file(lorem, eightbit_capa, version, ec_str)
+            inputs.append(filename)
+            expected.append(data)
+
+        # A failure must not prevent the decoding of the other items
+        inputs.insert(2, ["01", "10", "11"])
+        expected.insert(2, None)
+        inputs.append(None)
+        expected.append(None)
+
+        results = list(decode_many(inputs, workers=workers, chunksize=2, ordered=ordered,
+            versions=[1, 3]))
+        if ordered:
+            assert [item.index for item in results] == list(range(len(inputs)))
+        results.sort(key=lambda item: item.index)
+
+        assert [item.result and item.result.text for item in results] == expected
+        assert [item.error is None for item in results] == [True, True, False, True, True, False]
+        assert isinstance(results[2].error, ValueError)
+        assert isinstance(results[5].error, TypeError)
+
+    @pytest.mark.parametrize("engine", ['python', 'numpy'])
+    def test_warm_up(self, engine):
+        warm_up([5], engine)
+        tables = {
+            'python': [(engines._packed_data_modules, (5,)), (layout.get_data_mask, (5, 7))],
+            'numpy': [(engines._numpy_data_modules, (5,)), (engines._numpy_data_mask, (5, 7))],
+        }[engines.get_engine(engine).name]
+        for function, args in tables:
+            misses = function.cache_info().misses
+            function(*args)
+            assert function.cache_info().misses == misses
+
+    @pytest.fixture(scope="class")
+    def mixed_modes_qr(self):
+        qr_code = QRCode(version=3)
+        qr_code.add_data(QRData(b"ROUTE42", mode=MODE_ALPHA_NUM))
+        qr_code.add_data(QRData(b"payload", mode=MODE_8BIT_BYTE))
+        qr_code.add_data(QRData(b"12345", mode=MODE_NUMBER))
+        qr_code.make(fit=False)
+        return [''.join(str(int(module)) for module in row) for row in qr_code.modules]
+
+    def test_iter_segments(self, mixed_modes_qr):
+        segments = list(QrCodeDecoder(mixed_modes_qr).iter_segments())
+        assert [(segment.mode, segment.text) for segment in segments] == [
+                (consts.DataModeIndicator.ALPHANUMERIC, "ROUTE42"),
+                (consts.DataModeIndicator.EIGHTBITBYTE, "payload"),
+                (consts.DataModeIndicator.NUMERIC, "12345")]
+        assert QrCodeDecoder(mixed_modes_qr).decode().text == "ROUTE42payload12345"
+
+    def test_iter_segments_early_exit(self, mixed_modes_qr, monkeypatch):
+        parsed = []
+        monkeypatch.setattr(QrCodeDecoder, "_decode_eightbitbyte_segment",
+                staticmethod(lambda bitstream, char_count: parsed.append(char_count)))
+
+        for segment in QrCodeDecoder(mixed_modes_qr).iter_segments():
+            assert segment.text == "ROUTE42"
+            break
+        assert not parsed
@@ -0,0 +1,72 @@
+import pytest
+
+from ec.algebraic import DecodingFailure
+from ec.bch import BCH, BchDecodingFailure
+from ec.rs import ReedSolomon
+from ec.rs import ReedSolomonDecodingFailure
+
+# Version 1-M "HELLO WORLD" QR Code block: 16 data codewords followed by 10 EC codewords
+HELLO_WORLD_1M = [
+        32, 91, 11, 120, 209, 114, 220, 77, 67, 64, 236, 17, 236, 17, 236, 17,
+        196, 35, 39, 119, 235, 215, 231, 226, 93, 23
+]
+
+class TestSyndromes:
+    def test_syndromes_valid_codeword(self):
+        rs_code = ReedSolomon(8, 26, 16)
+        assert rs_code.syndromes(HELLO_WORLD_1M) == [0] * 10
+
+    def test_syndromes_one_error(self):
+        rs_code = ReedSolomon(8, 26, 16)
+        received = list(HELLO_WORLD_1M)
+        received[-1] ^= 1
+        # An error of magnitude 1 on the lowest degree term: all syndromes equal 1
+        assert rs_code.syndromes(received) == [1] * 10
+
+class TestDecode:
+    RS_1M = ReedSolomon(8, 26, 16, 4)
+
+    def test_decode_correct(self):
+        assert (0, HELLO_WORLD_1M) == self.RS_1M.decode(HELLO_WORLD_1M)
+
+    @pytest.mark.parametrize("position", range(26))
+    def test_decode_1_error(self, position):
+        received = list(HELLO_WORLD_1M)
+        received[position] ^= 0xa5
+        assert (1, HELLO_WORLD_1M) == self.RS_1M.decode(received)
+
+    def test_decode_up_to_capacity(self):
+        for nb_errors in range(1, 5):
+            received = list(HELLO_WORLD_1M)
+            for i in range(nb_errors):
+                received[5 * i + 3] ^= 17 * (i + 1)
+            assert (nb_errors, HELLO_WORLD_1M) == self.RS_1M.decode(received)
+
+    def test_decode_bytearray(self):
+        received = bytearray(HELLO_WORLD_1M)
+        received[0] = 0
+        received[25] = 0
+        assert (2, HELLO_WORLD_1M) == self.RS_1M.decode(received)
+
+    def test_decode_too_many_errors(self):
+        # 5 errors: more than the capacity of the block, but still within (n-k)/2
+        received = list(HELLO_WORLD_1M)
+        for i in range(5):
+            received[i] ^= 0xff
+        with pytest.raises(ReedSolomonDecodingFailure):
+            self.RS_1M.decode(received)
+
+class TestEncode:
+    def test_encode(self):
+        rs_code = ReedSolomon(8, 26, 16, 4)
+        assert rs_code.encode(HELLO_WORLD_1M[:16]) == HELLO_WORLD_1M
+        assert rs_code.decode(rs_code.encode(list(range(16)))) == (0, rs_code.encode(list(range(16))))
+
+        with pytest.raises(ValueError):
+            rs_code.encode([5])
+
+    def test_not_a_binary_bch(self):
+        # Reed-Solomon only shares the algebraic decoding steps with the binary BCH codes
+        assert not isinstance(ReedSolomon(8, 26, 16), BCH)
+        assert not issubclass(ReedSolomonDecodingFailure, BchDecodingFailure)
+        assert issubclass(ReedSolomonDecodingFailure, DecodingFailure)
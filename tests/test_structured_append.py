@@ -0,0 +1,134 @@
+import pytest
+
+from qr.bitstream import BitReader
+from qr.decoder import DecodeResult, QrCodeDecoder, StructuredAppend
+from qr.structured_append import StructuredAppendAssembler, assemble, parity
+
+def split_message(data, total):
+    """Decode results of a message split over total symbols"""
+
+    chunk_len = -(-len(data) // total)
+    results = []
+    for index in range(total):
+        chunk = data[index * chunk_len:(index + 1) * chunk_len]
+        results.append(DecodeResult(chunk.decode('ascii'), chunk, [], 1, 0, 0, [0], None,
+            StructuredAppend(index, total, parity(data))))
+    return results
+
+class TestParseHeader:
+    def test_header(self):
+        bitstream = BitReader.from_bitstring("0011" + "0010" + "0011" + "01011010" + "0100")
+        assert QrCodeDecoder._parse_structured_append(bitstream) == StructuredAppend(2, 4, 0x5a)
+        assert bitstream.pos == 20
+
+    @pytest.mark.parametrize(("bitstring"),
+        [   "0100" + "00000001" + "01000001" + "0000",
+            "0011" + "0010",
+            ""],
+        ids = ["other_mode", "too_short", "empty"])
+    def test_no_header(self, bitstring):
+        bitstream = BitReader.from_bitstring(bitstring)
+        assert QrCodeDecoder._parse_structured_append(bitstream) is None
+        assert bitstream.pos == 0
+
+    def test_position_out_of_sequence(self):
+        bitstream = BitReader.from_bitstring("0011" + "0100" + "0011" + "01011010")
+        with pytest.raises(ValueError):
+            QrCodeDecoder._parse_structured_append(bitstream)
+
+    def test_header_in_the_middle(self):
+        bitstream = BitReader.from_bitstring("0100" + "00000001" + "01000001" \
+                + "0011" + "0000" + "0001" + "01000001" + "0000")
+        with pytest.raises(ValueError):
+            list(QrCodeDecoder._decode_data_blocks_segments(bitstream, 1))
+
+class TestAssembler:
+    def test_out_of_order(self):
+        data = b"A large payload split over several symbols"
+        results = split_message(data, 5)
+
+        assembler = StructuredAppendAssembler()
+        for result in [results[3], results[0], results[4], results[1]]:
+            assert assembler.add(result) is None
+        assert len(assembler) == 1
+
+        message = assembler.add(results[2])
+        assert message.data == data
+        assert message.text == data.decode('ascii')
+        assert message.parity == parity(data)
+        assert message.results == results
+        assert len(assembler) == 0
+
+    def test_single_symbol(self):
+        result = DecodeResult("Hello", b"Hello", [], 1, 0, 0, [0], None, None)
+        message = StructuredAppendAssembler().add(result)
+        assert message == ("Hello", b"Hello", None, [result])
+
+    def test_interleaved_messages(self):
+        first = split_message(b"First message", 2)
+        second = split_message(b"Second message", 3)
+
+        messages = list(assemble([second[2], first[1], second[0], first[0], second[1]]))
+        assert [message.data for message in messages] == [b"First message", b"Second message"]
+
+    def test_duplicates(self):
+        results = split_message(b"Read twice", 2)
+        assembler = StructuredAppendAssembler()
+        assert assembler.add(results[0]) is None
+        assert assembler.add(results[0]) is None
+        assert assembler.add(results[1]).data == b"Read twice"
+
+        conflicting = results[0]._replace(data=b"Other")
+        assembler.add(results[0])
+        with pytest.raises(ValueError):
+            assembler.add(conflicting)
+        assert len(assembler) == 0
+
+    def test_parity_mismatch(self):
+        results = split_message(b"Bad parity", 2)
+        results[1] = results[1]._replace(data=b"parities")
+        assembler = StructuredAppendAssembler()
+        assembler.add(results[0])
+        with pytest.raises(ValueError):
+            assembler.add(results[1])
+        assert len(assembler) == 0
+
+    @pytest.mark.parametrize(("index", "total"), [(2, 2), (0, 0), (0, 17)])
+    def test_invalid_header(self, index, total):
+        result = split_message(b"Invalid", 2)[0]._replace(
+                structured_append=StructuredAppend(index, total, 0))
+        assembler = StructuredAppendAssembler()
+        with pytest.raises(ValueError):
+            assembler.add(result)
+        assert len(assembler) == 0
+
+    def test_bad_sets_dropped(self):
+        good = split_message(b"Good message", 2)
+        bad_parity = split_message(b"Bad parity", 2)
+        bad_parity[1] = bad_parity[1]._replace(data=b"parities")
+        conflict = split_message(b"Conflicting", 3)
+
+        errors = []
+        messages = list(assemble([good[0], bad_parity[0], conflict[0], bad_parity[1],
+                conflict[0]._replace(data=b"Other"), good[1]],
+                on_error=lambda result, error: errors.append(str(error))))
+        assert [message.data for message in messages] == [b"Good message"]
+        assert errors == ["Structured Append parity mismatch",
+                "Structured Append symbols conflict"]
+
+    def test_eviction(self):
+        messages = [split_message(f"Message {i}".encode('ascii'), 2) for i in range(4)]
+        assembler = StructuredAppendAssembler(max_sets=2)
+
+        assembler.add(messages[0][0])
+        assembler.add(messages[1][0])
+        # Feeding the first set again makes the second one the least recently used
+        assembler.add(messages[0][0])
+        assembler.add(messages[2][0])
+        assert len(assembler) == 2
+        assert assembler.evictions == 1
+
+        # The second symbol of an evicted set starts a new one
+        assert assembler.add(messages[1][1]) is None
+        assert assembler.evictions == 2
+        assert assembler.add(messages[2][1]).data == b"Message 2"